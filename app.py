@@ -1,19 +1,23 @@
 import streamlit as st
-import PyPDF2
-from PyPDF2 import PdfReader, PdfWriter
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.utils import ImageReader
-from PIL import Image, ImageDraw, ImageFont
 import io
 import zipfile
 from datetime import datetime
 import os
-import tempfile
-import fitz  # PyMuPDF pour la prévisualisation
-import numpy as np
 import json
-import base64
+import multiprocessing
+from concurrent.futures import as_completed, ProcessPoolExecutor
+import signing
+import preview
+import manifest
+import pades
+import sinks
+from signing import parse_page_numbers, get_pages_to_sign, PAGE_OPTIONS
+
+# Miniatures affichées par groupe (seules celles du groupe visible sont rendues)
+THUMBNAILS_PER_ROW = 6
+THUMBNAILS_PER_WINDOW = 24
+PREVIEW_MODES = ["Rendu final", "Cadre indicatif"]
+SINK_OPTIONS = ["Aucune (téléchargement uniquement)", "Dossier local", "Stockage S3"]
 
 # Configuration de la page
 st.set_page_config(
@@ -29,19 +33,24 @@ st.markdown("---")
 @st.cache_data
 def get_profiles_file_path():
     """Retourne le chemin du fichier de profils"""
-    # Utiliser le répertoire utilisateur pour la persistance
-    home_dir = os.path.expanduser("~")
-    app_dir = os.path.join(home_dir, ".streamlit_pdf_signature")
-    os.makedirs(app_dir, exist_ok=True)
-    return os.path.join(app_dir, "signature_profiles.json")
+    return signing.get_profiles_file_path()
+
+def get_file_version(path):
+    """Retourne (mtime, taille) pour invalider les caches quand un fichier change"""
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+@st.cache_data
+def read_profiles_cached(profiles_file, file_version):
+    """Lit les profils une seule fois par version du fichier (partagé entre sessions et reruns)"""
+    return signing.read_profiles()
 
 def load_profiles():
     """Charge les profils depuis le fichier JSON"""
     try:
         profiles_file = get_profiles_file_path()
-        if os.path.exists(profiles_file):
-            with open(profiles_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+        file_version = get_file_version(profiles_file) if os.path.exists(profiles_file) else None
+        return read_profiles_cached(profiles_file, file_version)
     except Exception as e:
         st.error(f"Erreur lors du chargement des profils: {str(e)}")
     return {}
@@ -82,6 +91,7 @@ def save_signature_image(signature_file, profile_name):
         signature_path = os.path.join(profiles_dir, signature_filename)
         
         # Sauvegarder l'image
+        from PIL import Image
         signature_file.seek(0)
         image = Image.open(signature_file)
         image.save(signature_path, "PNG")
@@ -91,30 +101,582 @@ def save_signature_image(signature_file, profile_name):
         st.error(f"Erreur lors de la sauvegarde de l'image: {str(e)}")
         return None
 
+@st.cache_data(max_entries=16)
+def read_signature_file(image_path, file_version):
+    """Lit les octets d'une image de signature une seule fois par version du fichier"""
+    with open(image_path, 'rb') as f:
+        return f.read()
+
 def load_signature_image(image_path):
-    """Charge une image de signature depuis le chemin"""
+    """Retourne les octets d'une image de signature sauvée, ou None si elle est introuvable"""
     try:
         if os.path.exists(image_path):
-            return Image.open(image_path)
+            return read_signature_file(image_path, get_file_version(image_path))
     except:
         pass
     return None
 
 def get_signature_as_uploadedfile(image_path):
     """Convertit une image sauvée en objet UploadedFile simulé"""
+    image_bytes = load_signature_image(image_path)
+    return io.BytesIO(image_bytes) if image_bytes else None
+
+@st.cache_resource
+def get_process_pool():
+    """Pool de processus partagé par les sessions pour signer les lots multi-signataires en parallèle
+
+    Les workers sont démarrés par "spawn": le serveur Streamlit a déjà plusieurs threads (dont le pool des
+    prévisualisations) et un fork pourrait copier un verrou tenu par l'un d'eux et bloquer le worker.
+    """
+    return ProcessPoolExecutor(max_workers=os.cpu_count() or 2, mp_context=multiprocessing.get_context("spawn"))
+
+@st.cache_data
+def parse_manifest_cached(data, filename):
+    """Lit le manifeste une seule fois par contenu"""
+    return manifest.parse_manifest(data, filename)
+
+@st.cache_resource
+def get_preview_font():
+    """Police de la prévisualisation en cadre indicatif, chargée une seule fois par processus"""
+    from PIL import ImageFont
+    return ImageFont.load_default()
+
+@st.cache_data(max_entries=32)
+def get_overlay_bytes(signature_bytes, nom, date_sig, x, y, width, height, text_offset, font_size):
+    """Crée l'overlay de signature une seule fois par jeu de paramètres (prévisualisation)"""
+    packet = signing.create_signature_overlay(io.BytesIO(signature_bytes), nom, date_sig, x, y, width, height, text_offset, font_size)
+    return packet.getvalue()
+
+# Curseurs de placement (clés de session) et champs de profil correspondants
+PLACEMENT_KEYS = {
+    'placement_x': 'x_position',
+    'placement_y': 'y_position',
+    'placement_width': 'signature_width',
+    'placement_height': 'signature_height',
+}
+PLACEMENT_DEFAULTS = {'x_position': 400, 'y_position': 100, 'signature_width': 120, 'signature_height': 60}
+
+def apply_profile_placement():
+    """Recopie le placement du profil choisi dans les curseurs (appelé au changement de profil)"""
+    profile_data = load_profiles().get(st.session_state.profile_selector, {})
+    for key, field in PLACEMENT_KEYS.items():
+        st.session_state[key] = int(profile_data.get(field, PLACEMENT_DEFAULTS[field]))
+
+def placement_settings():
+    """Placement courant, lu dans la session: les curseurs sont dans le fragment de prévisualisation"""
+    for key, field in PLACEMENT_KEYS.items():
+        if key not in st.session_state:
+            st.session_state[key] = PLACEMENT_DEFAULTS[field]
+    return {field: st.session_state[key] for key, field in PLACEMENT_KEYS.items()}
+
+def current_stamp(profile_settings, date_sig):
+    """Tampon par page au placement courant (None sans modèle ou si le modèle est invalide)"""
     try:
-        if os.path.exists(image_path):
-            with open(image_path, 'rb') as f:
-                return io.BytesIO(f.read())
-    except:
-        pass
-    return None
+        return signing.stamp_params_from_profile(profile_settings, date_sig)
+    except ValueError:
+        return None
+
+# Sections réexécutées seules lorsqu'on interagit avec leurs widgets (fragments)
+@st.fragment
+def profile_library(signature_profiles, text_settings, signature_file, active_signature):
+    """Sauvegarde du profil courant, liste et nettoyage des profils"""
+    # Sauvegarde du profil
+    st.subheader("💾 Sauvegarder le profil")
+
+    col_save1, col_save2 = st.columns([2, 1])
+
+    with col_save1:
+        profile_name = st.text_input(
+            "Nom du profil:",
+            value=st.session_state.current_profile if st.session_state.current_profile else "",
+            placeholder="Ex: Signature officielle",
+            help="Donnez un nom à cette configuration"
+        )
+
+    with col_save2:
+        if st.button("💾 Sauver", help="Sauvegarder ce profil", key="save_profile"):
+            if profile_name.strip():
+                # Sauvegarde de l'image de signature si présente
+                signature_image_path = None
+                if active_signature:
+                    if signature_file:
+                        # Sauvegarder la nouvelle image uploadée
+                        signature_image_path = save_signature_image(signature_file, profile_name)
+                    elif st.session_state.loaded_signature:
+                        # Conserver l'image existante du profil
+                        signature_image_path = st.session_state.loaded_signature
+
+                # Création du profil
+                profile_data = dict(text_settings, **placement_settings())
+                profile_data['created_date'] = datetime.now().strftime("%d/%m/%Y %H:%M")
+                profile_data['updated_date'] = datetime.now().strftime("%d/%m/%Y %H:%M")
+
+                # Ajouter le chemin de l'image si elle existe
+                if signature_image_path:
+                    profile_data['signature_image_path'] = signature_image_path
+
+                signature_profiles[profile_name] = profile_data
+                st.session_state.current_profile = profile_name
+
+                # Sauvegarde persistante
+                if save_profiles(signature_profiles):
+                    if signature_image_path:
+                        st.success(f"✅ Profil '{profile_name}' sauvegardé avec image de signature!")
+                    else:
+                        st.success(f"✅ Profil '{profile_name}' sauvegardé!")
+                    # Le sélecteur de profils doit être mis à jour: rerun complet
+                    st.rerun()
+                else:
+                    st.error("❌ Erreur lors de la sauvegarde")
+            else:
+                st.error("❌ Veuillez saisir un nom pour le profil")
+
+    # Liste des profils existants
+    if signature_profiles:
+        with st.expander(f"📋 Profils sauvegardés ({len(signature_profiles)})", expanded=False):
+            for profile_name, profile_data in signature_profiles.items():
+                st.write(f"**{profile_name}**")
+                st.write(f"- Position: {profile_data['x_position']},{profile_data['y_position']}")
+                st.write(f"- Taille: {profile_data['signature_width']}x{profile_data['signature_height']}")
+                st.write(f"- Pages: {profile_data['page_option']}")
+                if 'nom_signataire' in profile_data and profile_data['nom_signataire']:
+                    st.write(f"- Signataire: {profile_data['nom_signataire']}")
+                if 'signature_image_path' in profile_data:
+                    st.write("- 📷 Image de signature: ✅")
+                else:
+                    st.write("- 📷 Image de signature: ❌")
+                st.write(f"- Créé: {profile_data['created_date']}")
+                if 'updated_date' in profile_data:
+                    st.write(f"- Modifié: {profile_data['updated_date']}")
+                st.write("---")
+
+    # Bouton pour nettoyer tous les profils (en cas de besoin)
+    if signature_profiles:
+        if st.button("🧹 Nettoyer tous les profils", help="Supprimer tous les profils sauvegardés", key="clear_all_profiles"):
+            if st.button("⚠️ Confirmer la suppression", key="confirm_clear"):
+                try:
+                    profiles_file = get_profiles_file_path()
+                    if os.path.exists(profiles_file):
+                        os.remove(profiles_file)
+                    st.success("✅ Tous les profils ont été supprimés!")
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"❌ Erreur: {str(e)}")
+
+def show_position_summary(placeholder):
+    """Affiche le placement courant dans le récapitulatif de l'onglet Traitement"""
+    placement = placement_settings()
+    with placeholder.container():
+        st.write("**📍 Position:**")
+        st.write(f"- X: {placement['x_position']}px")
+        st.write(f"- Y: {placement['y_position']}px")
+        st.write(f"- Taille: {placement['signature_width']}x{placement['signature_height']}px")
+
+@st.fragment
+def preview_panel(pdf_files, selected_pdf_index, active_signature, text_settings, date_sig, position_summary=None):
+    """Placement de la signature et vues qui en dépendent: prévisualisation, miniatures et grille du lot
+
+    Les curseurs de placement sont dans ce fragment: les déplacer ne réexécute que ces vues. Les miniatures
+    et la grille sont des fragments imbriqués, qui se réexécutent seuls pour leurs propres widgets.
+    `position_summary` est l'emplacement du récapitulatif de l'onglet Traitement, mis à jour ici.
+    """
+    st.header("🔍 Prévisualisation PDF")
+
+    col_placement, col_preview = st.columns([1, 1])
+    with col_placement:
+        # Paramètres de position
+        st.subheader("📍 Position de la signature")
+
+        col_pos1, col_pos2 = st.columns(2)
+        with col_pos1:
+            st.slider("Position X", 0, 500, key="placement_x", help="Position horizontale en pixels")
+            st.slider("Largeur", 50, 200, key="placement_width", help="Largeur de la signature en pixels")
+
+        with col_pos2:
+            st.slider("Position Y", 0, 700, key="placement_y", help="Position verticale en pixels")
+            st.slider("Hauteur", 30, 150, key="placement_height", help="Hauteur de la signature en pixels")
+
+        preview_mode = st.radio(
+            "Mode de prévisualisation",
+            PREVIEW_MODES,
+            horizontal=True,
+            help="Le rendu final appose la vraie signature sur la page; le cadre indicatif est plus rapide mais approximatif"
+        )
+
+    if position_summary is not None:
+        show_position_summary(position_summary)
+
+    with col_preview:
+        signed_preview(pdf_files, selected_pdf_index, active_signature, text_settings, date_sig, preview_mode)
+
+    if pdf_files:
+        thumbnail_strip(pdf_files, selected_pdf_index, active_signature, text_settings, date_sig)
+
+    if pdf_files and len(pdf_files) > 1 and active_signature and text_settings['nom_signataire']:
+        batch_grid(pdf_files, active_signature, text_settings, date_sig)
+
+def signed_preview(pdf_files, selected_pdf_index, active_signature, text_settings, date_sig, preview_mode):
+    """Prévisualisation de la page signée du PDF sélectionné avec le placement courant"""
+    profile_settings = dict(text_settings, **placement_settings())
+    signature_params = signing.overlay_params_from_profile(profile_settings, date_sig)
+    page_option, custom_pages = profile_settings['page_option'], profile_settings['custom_pages']
+    stamp = current_stamp(profile_settings, date_sig)
+
+    nom_signataire = signature_params['nom']
+    date_signature = signature_params['date_sig']
+    x_position, y_position = signature_params['x'], signature_params['y']
+    signature_width, signature_height = signature_params['width'], signature_params['height']
+    text_offset_y, text_size = signature_params['text_offset'], signature_params['font_size']
+
+    # Message d'aide si pas de signature ou nom
+    if not active_signature:
+        st.info("📝 Uploadez une image de signature ou chargez un profil avec image pour voir la prévisualisation")
+    elif not nom_signataire:
+        st.info("👤 Saisissez un nom de signataire pour voir la prévisualisation complète")
+    elif pdf_files and active_signature:
+        try:
+            # Sélection du PDF à prévisualiser
+            selected_pdf = pdf_files[selected_pdf_index]
+
+            # Lecture du PDF sans modifier la position du pointeur
+            pdf_bytes = selected_pdf.getvalue()
+
+            pdf_hash = preview.pdf_hash(pdf_bytes)
+
+            # Déterminer quelle page prévisualiser selon l'option choisie
+            total_pages = preview.get_page_count(pdf_bytes, pdf_hash)
+
+            if page_option == "Première page uniquement":
+                preview_page_num = 0
+                preview_info = "Page 1"
+            elif page_option == "Dernière page uniquement":
+                preview_page_num = total_pages - 1
+                preview_info = f"Page {total_pages} (dernière)"
+            elif page_option == "Toutes les pages":
+                preview_page_num = 0  # Montrer la première page comme exemple
+                preview_info = "Page 1 (signature sur toutes les pages)"
+            elif page_option == "Pages personnalisées" and custom_pages:
+                # Essayer de montrer la première page spécifiée
+                pages_to_sign = parse_page_numbers(custom_pages, total_pages)
+                if pages_to_sign:
+                    preview_page_num = pages_to_sign[0] - 1  # Convertir en 0-indexé
+                    if len(pages_to_sign) == 1:
+                        preview_info = f"Page {pages_to_sign[0]}"
+                    else:
+                        preview_info = f"Page {pages_to_sign[0]} (première des pages sélectionnées: {', '.join(map(str, pages_to_sign))})"
+                else:
+                    preview_page_num = 0
+                    preview_info = "Page 1 (aucune page valide spécifiée)"
+            else:
+                preview_page_num = 0
+                preview_info = "Page 1"
+
+            # S'assurer que le numéro de page est valide
+            if preview_page_num >= total_pages:
+                preview_page_num = 0
+                preview_info = "Page 1 (page demandée non trouvée)"
+
+            if preview_mode == PREVIEW_MODES[0]:
+                # Rendu exact: l'overlay réel est apposé sur la seule page prévisualisée
+                overlay_bytes = get_overlay_bytes(active_signature.getvalue(), **signature_params)
+                preview_image = preview.render_signed_page(pdf_bytes, pdf_hash, preview_page_num, overlay_bytes,
+                                                           stamp=signing.stamp_for_file(stamp, selected_pdf.name))
+            else:
+                from PIL import Image, ImageDraw
+
+                # Conversion en image avec une résolution plus élevée
+                img_data = preview.render_thumbnail(pdf_bytes, pdf_hash, preview_page_num, dpi=preview.PREVIEW_ZOOM * 72)
+
+                # Chargement de l'image avec PIL
+                pdf_image = Image.open(io.BytesIO(img_data))
+                img_width, img_height = pdf_image.size
+
+                # Facteurs de conversion
+                scale_x = scale_y = preview.PREVIEW_ZOOM
+
+                # Conversion des coordonnées (PDF: origine en bas à gauche, Image: origine en haut à gauche)
+                img_x = int(x_position * scale_x)
+                img_y = int(img_height - (y_position + signature_height) * scale_y)
+                img_sig_width = int(signature_width * scale_x)
+                img_sig_height = int(signature_height * scale_y)
+
+                # Création d'une copie pour dessiner la prévisualisation
+                preview_image = pdf_image.copy()
+                draw = ImageDraw.Draw(preview_image)
+
+                # Dessin du rectangle de signature avec fond semi-transparent
+                # Création d'une overlay pour la transparence
+                overlay = Image.new('RGBA', preview_image.size, (0, 0, 0, 0))
+                overlay_draw = ImageDraw.Draw(overlay)
+
+                # Rectangle de fond pour la signature
+                overlay_draw.rectangle([img_x, img_y, img_x + img_sig_width, img_y + img_sig_height],
+                                     fill=(255, 0, 0, 50), outline=(255, 0, 0, 255), width=3)
+
+                # Fusionner l'overlay avec l'image principale
+                preview_image = preview_image.convert('RGBA')
+                preview_image = Image.alpha_composite(preview_image, overlay)
+                preview_image = preview_image.convert('RGB')
+
+                # Redessiner le contour
+                draw = ImageDraw.Draw(preview_image)
+                draw.rectangle([img_x, img_y, img_x + img_sig_width, img_y + img_sig_height],
+                             outline="red", width=3)
+
+                # Ajout du texte de prévisualisation
+                font = get_preview_font()
+
+                if nom_signataire:
+                    text_y = img_y + img_sig_height + int(abs(text_offset_y) * scale_y)
+                    # Formatage du texte avec "Signé par"
+                    signature_text = f"Signé par: {nom_signataire}"
+                    draw.text((img_x, text_y), signature_text, fill="red", font=font)
+
+                    if date_signature:
+                        date_y = text_y + 15
+                        # Format de date DD/MM/YYYY
+                        date_formatted = date_signature.strftime("%d/%m/%Y")
+                        draw.text((img_x, date_y), f"Date: {date_formatted}", fill="red", font=font)
+
+            # Affichage de l'image avec prévisualisation
+            st.image(preview_image, caption=f"Prévisualisation: {selected_pdf.name} - {preview_info}", use_container_width=True)
+
+            # Informations détaillées sur la page et position
+            col_info_a, col_info_b = st.columns(2)
+            with col_info_a:
+                st.info(f"📍 Position signature: X={x_position}px, Y={y_position}px")
+            with col_info_b:
+                st.info(f"📄 Prévisualisation: {preview_info}")
+
+            # Information sur les pages qui seront réellement signées
+            if page_option == "Pages personnalisées" and custom_pages:
+                pages_to_sign = parse_page_numbers(custom_pages, total_pages)
+                if pages_to_sign:
+                    if len(pages_to_sign) > 1:
+                        st.success(f"✅ Signature sera apposée sur les pages: {', '.join(map(str, pages_to_sign))}")
+                    else:
+                        st.success(f"✅ Signature sera apposée sur la page: {pages_to_sign[0]}")
+                else:
+                    st.warning("⚠️ Aucune page valide spécifiée")
+            elif page_option == "Toutes les pages":
+                st.success(f"✅ Signature sera apposée sur toutes les pages (1 à {total_pages})")
+            elif page_option == "Dernière page uniquement":
+                st.success(f"✅ Signature sera apposée sur la dernière page ({total_pages})")
+            else:
+                st.success("✅ Signature sera apposée sur la première page")
+
+            # Aperçu des informations de signature
+            with st.expander("ℹ️ Informations de signature", expanded=False):
+                col_info1, col_info2 = st.columns(2)
+                with col_info1:
+                    st.write(f"**📝 Texte:** Signé par: {nom_signataire}")
+                    if date_signature:
+                        date_formatted = date_signature.strftime("%d/%m/%Y")
+                        st.write(f"**📅 Date:** {date_formatted}")
+                    st.write(f"**📄 Document:** {total_pages} page(s)")
+                with col_info2:
+                    st.write(f"**📏 Taille texte:** {text_size}px")
+                    st.write(f"**📐 Décalage:** {text_offset_y}px")
+                    st.write(f"**📄 Pages:** {page_option}")
+                    if page_option == "Pages personnalisées" and custom_pages:
+                        st.write(f"**📋 Pages spécifiques:** {custom_pages}")
+                    if st.session_state.current_profile:
+                        st.write(f"**💾 Profil:** {st.session_state.current_profile}")
+
+        except Exception as e:
+            st.error(f"Erreur lors de la prévisualisation: {str(e)}")
+            st.info("💡 Astuce: Assurez-vous que le PDF n'est pas protégé et réessayez.")
+
+    # Affichage du profil chargé même sans PDF
+    if st.session_state.current_profile and not pdf_files:
+        st.info(f"💾 Profil '{st.session_state.current_profile}' chargé. Uploadez un PDF pour voir la prévisualisation.")
+
+@st.fragment
+def thumbnail_strip(pdf_files, selected_pdf_index, active_signature, text_settings, date_sig):
+    """Miniatures de toutes les pages du PDF sélectionné, les pages signées avec l'overlay réel"""
+    profile_settings = dict(text_settings, **placement_settings())
+    signature_params = signing.overlay_params_from_profile(profile_settings, date_sig)
+    page_option, custom_pages = profile_settings['page_option'], profile_settings['custom_pages']
+    st.markdown("---")
+    st.subheader("🗂️ Miniatures des pages")
+
+    try:
+        thumb_pdf = pdf_files[selected_pdf_index]
+        thumb_bytes = thumb_pdf.getvalue()
+        thumb_hash = preview.pdf_hash(thumb_bytes)
+        thumb_total = preview.get_page_count(thumb_bytes, thumb_hash)
+        signed_pages = get_pages_to_sign(page_option, custom_pages, thumb_total)
+
+        col_thumb1, col_thumb2 = st.columns([1, 2])
+        with col_thumb1:
+            only_signed = st.checkbox("✍️ Uniquement les pages signées", value=False, key="thumbs_only_signed")
+
+        # Seules les miniatures de la fenêtre affichée sont rendues
+        thumb_pages = signed_pages if only_signed else list(range(1, thumb_total + 1))
+        window_count = max(1, -(-len(thumb_pages) // THUMBNAILS_PER_WINDOW))
+        with col_thumb2:
+            if window_count > 1:
+                window_index = st.number_input(
+                    f"Groupe de miniatures (1 à {window_count})",
+                    min_value=1,
+                    max_value=window_count,
+                    value=1,
+                    key=f"thumbs_window_{thumb_hash}_{only_signed}"
+                ) - 1
+            else:
+                window_index = 0
+        window_pages = thumb_pages[window_index * THUMBNAILS_PER_WINDOW:(window_index + 1) * THUMBNAILS_PER_WINDOW]
+
+        if window_pages:
+            st.caption(
+                f"Pages {window_pages[0]} à {window_pages[-1]} sur {thumb_total} - "
+                f"{len(signed_pages)} page(s) recevront la signature (affichée sur les miniatures marquées ✍️)"
+            )
+
+            # Emplacements affichés au fur et à mesure du rendu
+            signed_set = set(signed_pages)
+            thumb_columns = st.columns(THUMBNAILS_PER_ROW)
+            placeholders = {}
+            for i, page_num in enumerate(window_pages):
+                with thumb_columns[i % THUMBNAILS_PER_ROW]:
+                    placeholders[page_num - 1] = st.empty()
+
+            # Pages signées de la fenêtre rendues avec la signature, le texte et le tampon du document
+            overlay_bytes = None
+            if active_signature and signature_params['nom']:
+                overlay_bytes = get_overlay_bytes(active_signature.getvalue(), **signature_params)
+            futures = preview.submit_thumbnails(
+                thumb_bytes,
+                thumb_hash,
+                [page_num - 1 for page_num in window_pages],
+                signed_indexes={page_num - 1 for page_num in window_pages if page_num in signed_set},
+                overlay_bytes=overlay_bytes,
+                stamp=signing.stamp_for_file(current_stamp(profile_settings, date_sig), thumb_pdf.name)
+            )
+            for future in as_completed(futures):
+                page_index = futures[future]
+                caption = f"✍️ Page {page_index + 1}" if (page_index + 1) in signed_set else f"Page {page_index + 1}"
+                placeholders[page_index].image(future.result(), caption=caption, use_container_width=True)
+        else:
+            st.info("Aucune page à afficher")
+    except Exception as e:
+        st.error(f"Erreur lors du rendu des miniatures: {str(e)}")
+
+@st.fragment
+def batch_grid(pdf_files, active_signature, text_settings, date_sig):
+    """Grille de contrôle: première page signée de chaque fichier du lot"""
+    profile_settings = dict(text_settings, **placement_settings())
+    signature_params = signing.overlay_params_from_profile(profile_settings, date_sig)
+    page_option, custom_pages = profile_settings['page_option'], profile_settings['custom_pages']
+    stamp = current_stamp(profile_settings, date_sig)
+    st.markdown("---")
+    st.subheader("🧮 Contrôle du lot")
+
+    if st.checkbox(f"Afficher la première page signée des {len(pdf_files)} fichiers", value=False, key="batch_grid"):
+        try:
+            grid_overlay = get_overlay_bytes(active_signature.getvalue(), **signature_params)
+            grid_documents = []
+            for pdf in pdf_files:
+                grid_bytes = pdf.getvalue()
+                grid_documents.append((grid_bytes, preview.pdf_hash(grid_bytes), pdf.name))
+
+            grid_progress = st.progress(0)
+            grid_columns = st.columns(THUMBNAILS_PER_ROW)
+            grid_placeholders = []
+            for i in range(len(pdf_files)):
+                with grid_columns[i % THUMBNAILS_PER_ROW]:
+                    grid_placeholders.append(st.empty())
+
+            futures = preview.submit_first_signed_pages(
+                grid_documents,
+                page_option,
+                custom_pages,
+                grid_overlay,
+                stamp=stamp
+            )
+            for done, future in enumerate(as_completed(futures), start=1):
+                index = futures[future]
+                try:
+                    page_num, png = future.result()
+                    if png:
+                        grid_placeholders[index].image(png, caption=f"{pdf_files[index].name} - page {page_num}", use_container_width=True)
+                    else:
+                        grid_placeholders[index].warning(f"{pdf_files[index].name}: aucune page à signer")
+                except Exception as e:
+                    grid_placeholders[index].error(f"{pdf_files[index].name}: {str(e)}")
+                grid_progress.progress(done / len(futures))
+            grid_progress.empty()
+        except Exception as e:
+            st.error(f"Erreur lors du rendu de la grille: {str(e)}")
+
+@st.fragment
+def results_panel():
+    """Téléchargement des fichiers traités"""
+    st.success(f"✅ {len(st.session_state.processed_files)} fichier(s) traité(s) avec succès!")
+
+    # Boutons de téléchargement
+    if len(st.session_state.processed_files) > 1:
+        # Le ZIP est construit une seule fois à la fin du traitement
+        st.download_button(
+            label="📥 Télécharger tous les PDFs signés (ZIP)",
+            data=st.session_state.processed_zip,
+            file_name=st.session_state.processed_zip_name,
+            mime="application/zip",
+            key="download_zip"
+        )
+
+    elif len(st.session_state.processed_files) == 1:
+        st.download_button(
+            label="📥 Télécharger le PDF signé",
+            data=st.session_state.processed_files[0]['data'],
+            file_name=st.session_state.processed_files[0]['name'],
+            mime="application/pdf",
+            key="download_single"
+        )
+
+    # Latence de la signature numérique par fichier
+    report = st.session_state.signing_report
+    if report:
+        latencies = sorted(row['Latence (ms)'] for row in report)
+        st.info(
+            f"🔏 {len(report)} signature(s) numérique(s) PAdES - latence par fichier: "
+            f"médiane {latencies[len(latencies) // 2]:.0f} ms, max {latencies[-1]:.0f} ms"
+        )
+        with st.expander("⏱️ Détail des latences de signature", expanded=False):
+            st.dataframe(report, hide_index=True, use_container_width=True)
+
+    # Envois vers la destination choisie
+    uploads = st.session_state.sink_report
+    if uploads:
+        failed = [row for row in uploads['fichiers'] if row['Erreur']]
+        sent = len(uploads['fichiers']) - len(failed)
+        if failed:
+            st.warning(f"📤 {sent} fichier(s) envoyé(s) vers {uploads['destination']}, {len(failed)} échec(s)")
+        else:
+            st.success(f"📤 {sent} fichier(s) envoyé(s) vers {uploads['destination']}")
+        with st.expander("📤 Détail des envois", expanded=bool(failed)):
+            st.dataframe(uploads['fichiers'], hide_index=True, use_container_width=True)
+
+    # Bouton pour nouveau traitement
+    if st.button("🔄 Nouveau traitement", key="reset"):
+        st.session_state.processed_files = []
+        st.session_state.processed_zip = None
+        st.session_state.signing_report = None
+        st.session_state.sink_report = None
+        st.session_state.processing_complete = False
+        st.rerun()
 
 # Variables de session pour maintenir l'état
 if 'processed_files' not in st.session_state:
     st.session_state.processed_files = []
 if 'processing_complete' not in st.session_state:
     st.session_state.processing_complete = False
+if 'processed_zip' not in st.session_state:
+    st.session_state.processed_zip = None
+if 'signing_report' not in st.session_state:
+    st.session_state.signing_report = None
+if 'sink_report' not in st.session_state:
+    st.session_state.sink_report = None
 if 'current_profile' not in st.session_state:
     st.session_state.current_profile = None
 if 'loaded_signature' not in st.session_state:
@@ -123,49 +685,6 @@ if 'loaded_signature' not in st.session_state:
 # Chargement des profils depuis le fichier
 signature_profiles = load_profiles()
 
-# Fonctions pour le traitement des pages
-def parse_page_numbers(page_string, total_pages):
-    """Parse une chaîne de pages personnalisées et retourne une liste de numéros de page"""
-    if not page_string:
-        return []
-    
-    pages = set()
-    parts = page_string.replace(" ", "").split(",")
-    
-    for part in parts:
-        if "-" in part:
-            # Plage de pages (ex: 1-3)
-            try:
-                start, end = part.split("-")
-                start = max(1, int(start))
-                end = min(total_pages, int(end))
-                pages.update(range(start, end + 1))
-            except ValueError:
-                continue
-        else:
-            # Page unique
-            try:
-                page_num = int(part)
-                if 1 <= page_num <= total_pages:
-                    pages.add(page_num)
-            except ValueError:
-                continue
-    
-    return sorted(list(pages))
-
-def get_pages_to_sign(page_option, custom_pages, total_pages):
-    """Détermine quelles pages doivent être signées selon l'option choisie"""
-    if page_option == "Première page uniquement":
-        return [1] if total_pages > 0 else []
-    elif page_option == "Dernière page uniquement":
-        return [total_pages] if total_pages > 0 else []
-    elif page_option == "Toutes les pages":
-        return list(range(1, total_pages + 1))
-    elif page_option == "Pages personnalisées":
-        return parse_page_numbers(custom_pages, total_pages)
-    else:
-        return [1]  # Par défaut, première page
-
 # Sidebar pour les paramètres
 with st.sidebar:
     st.header("⚙️ Paramètres de signature")
@@ -181,7 +700,8 @@ with st.sidebar:
             selected_profile = st.selectbox(
                 "Charger un profil:",
                 ["Nouveau profil"] + list(signature_profiles.keys()),
-                key="profile_selector"
+                key="profile_selector",
+                on_change=apply_profile_placement
             )
         else:
             selected_profile = "Nouveau profil"
@@ -196,25 +716,20 @@ with st.sidebar:
                     st.rerun()
     
     # Chargement du profil sélectionné
-    profile_loaded = False
     loaded_signature_path = None
     
     if selected_profile != "Nouveau profil" and selected_profile in signature_profiles:
         profile_data = signature_profiles[selected_profile]
         st.session_state.current_profile = selected_profile
-        profile_loaded = True
         
         # Valeurs par défaut du profil
-        default_x = profile_data.get('x_position', 400)
-        default_y = profile_data.get('y_position', 100)
-        default_width = profile_data.get('signature_width', 120)
-        default_height = profile_data.get('signature_height', 60)
         default_text_offset = profile_data.get('text_offset_y', -20)
         default_text_size = profile_data.get('text_size', 8)
         default_page_option = profile_data.get('page_option', "Première page uniquement")
         default_custom_pages = profile_data.get('custom_pages', "")
         default_inclure_date = profile_data.get('inclure_date', True)
         default_nom_signataire = profile_data.get('nom_signataire', "")
+        default_modele_tampon = profile_data.get('modele_tampon', "")
         loaded_signature_path = profile_data.get('signature_image_path')
         
         st.success(f"✅ Profil '{selected_profile}' chargé")
@@ -234,16 +749,13 @@ with st.sidebar:
             st.session_state.loaded_signature = None
     else:
         # Valeurs par défaut pour nouveau profil
-        default_x = 400
-        default_y = 100
-        default_width = 120
-        default_height = 60
         default_text_offset = -20
         default_text_size = 8
         default_page_option = "Première page uniquement"
         default_custom_pages = ""
         default_inclure_date = True
         default_nom_signataire = ""
+        default_modele_tampon = ""
         st.session_state.current_profile = None
         st.session_state.loaded_signature = None
     
@@ -261,15 +773,11 @@ with st.sidebar:
     
     if signature_file:
         # Image uploadée prioritaire
-        sig_image = Image.open(signature_file)
-        st.image(sig_image, caption="Aperçu de la signature uploadée", width=200)
+        st.image(signature_file.getvalue(), caption="Aperçu de la signature uploadée", width=200)
         active_signature = signature_file
     elif st.session_state.loaded_signature:
-        # Utiliser l'image du profil si pas d'upload
-        loaded_image = load_signature_image(st.session_state.loaded_signature)
-        if loaded_image:
-            active_signature = get_signature_as_uploadedfile(st.session_state.loaded_signature)
-            # L'image du profil est déjà affichée plus haut
+        # Utiliser l'image du profil si pas d'upload (elle est déjà affichée plus haut)
+        active_signature = get_signature_as_uploadedfile(st.session_state.loaded_signature)
     
     # Message d'information sur l'image active
     if active_signature:
@@ -280,17 +788,7 @@ with st.sidebar:
     
     st.markdown("---")
     
-    # Paramètres de position
-    st.subheader("📍 Position de la signature")
-    
-    col1, col2 = st.columns(2)
-    with col1:
-        x_position = st.slider("Position X", 0, 500, default_x, help="Position horizontale en pixels")
-        signature_width = st.slider("Largeur", 50, 200, default_width, help="Largeur de la signature en pixels")
-    
-    with col2:
-        y_position = st.slider("Position Y", 0, 700, default_y, help="Position verticale en pixels")
-        signature_height = st.slider("Hauteur", 30, 150, default_height, help="Hauteur de la signature en pixels")
+    st.caption("📍 La position et la taille de la signature se règlent au-dessus de la prévisualisation")
     
     st.markdown("---")
     
@@ -321,6 +819,20 @@ with st.sidebar:
     text_size = st.slider("Taille du texte", 6, 14, default_text_size, 
                          help="Taille de la police pour le nom et la date")
     
+    # Texte variable ajouté sous le nom et la date de chaque page signée
+    modele_tampon = st.text_input(
+        "🏷️ Tampon par page (facultatif)",
+        value=default_modele_tampon,
+        placeholder="Ex: Paraphe - page {page}/{total}",
+        help="Champs disponibles: {page}, {total}, {fichier}, {nom}, {date}, {heure} et les champs du profil "
+             "(ex: {nom_signataire}). Toutes les variantes d'un document sont rendues en une seule fois."
+    )
+    if modele_tampon:
+        try:
+            signing.stamp_template_fields(modele_tampon)
+        except ValueError as e:
+            st.error(f"❌ {str(e)}")
+    
     st.markdown("---")
     
     # Sélection des pages
@@ -328,8 +840,8 @@ with st.sidebar:
     
     page_option = st.selectbox(
         "Choisir les pages à signer:",
-        ["Première page uniquement", "Dernière page uniquement", "Toutes les pages", "Pages personnalisées"],
-        index=["Première page uniquement", "Dernière page uniquement", "Toutes les pages", "Pages personnalisées"].index(default_page_option),
+        PAGE_OPTIONS,
+        index=PAGE_OPTIONS.index(default_page_option),
         help="Sélectionnez quelles pages doivent être signées"
     )
     
@@ -345,98 +857,30 @@ with st.sidebar:
     
     st.markdown("---")
     
-    # Sauvegarde du profil
-    st.subheader("💾 Sauvegarder le profil")
-    
-    col_save1, col_save2 = st.columns([2, 1])
-    
-    with col_save1:
-        profile_name = st.text_input(
-            "Nom du profil:",
-            value=st.session_state.current_profile if st.session_state.current_profile else "",
-            placeholder="Ex: Signature officielle",
-            help="Donnez un nom à cette configuration"
-        )
-    
-    with col_save2:
-        if st.button("💾 Sauver", help="Sauvegarder ce profil", key="save_profile"):
-            if profile_name.strip():
-                # Sauvegarde de l'image de signature si présente
-                signature_image_path = None
-                if active_signature:
-                    if signature_file:
-                        # Sauvegarder la nouvelle image uploadée
-                        signature_image_path = save_signature_image(signature_file, profile_name)
-                    elif st.session_state.loaded_signature:
-                        # Conserver l'image existante du profil
-                        signature_image_path = st.session_state.loaded_signature
-                
-                # Création du profil
-                profile_data = {
-                    'x_position': x_position,
-                    'y_position': y_position,
-                    'signature_width': signature_width,
-                    'signature_height': signature_height,
-                    'text_offset_y': text_offset_y,
-                    'text_size': text_size,
-                    'page_option': page_option,
-                    'custom_pages': custom_pages if page_option == "Pages personnalisées" else "",
-                    'inclure_date': inclure_date,
-                    'nom_signataire': nom_signataire,
-                    'created_date': datetime.now().strftime("%d/%m/%Y %H:%M"),
-                    'updated_date': datetime.now().strftime("%d/%m/%Y %H:%M")
-                }
-                
-                # Ajouter le chemin de l'image si elle existe
-                if signature_image_path:
-                    profile_data['signature_image_path'] = signature_image_path
-                
-                signature_profiles[profile_name] = profile_data
-                st.session_state.current_profile = profile_name
-                
-                # Sauvegarde persistante
-                if save_profiles(signature_profiles):
-                    if signature_image_path:
-                        st.success(f"✅ Profil '{profile_name}' sauvegardé avec image de signature!")
-                    else:
-                        st.success(f"✅ Profil '{profile_name}' sauvegardé!")
-                    st.rerun()
-                else:
-                    st.error("❌ Erreur lors de la sauvegarde")
-            else:
-                st.error("❌ Veuillez saisir un nom pour le profil")
-    
-    # Liste des profils existants
-    if signature_profiles:
-        with st.expander(f"📋 Profils sauvegardés ({len(signature_profiles)})", expanded=False):
-            for profile_name, profile_data in signature_profiles.items():
-                st.write(f"**{profile_name}**")
-                st.write(f"- Position: {profile_data['x_position']},{profile_data['y_position']}")
-                st.write(f"- Taille: {profile_data['signature_width']}x{profile_data['signature_height']}")
-                st.write(f"- Pages: {profile_data['page_option']}")
-                if 'nom_signataire' in profile_data and profile_data['nom_signataire']:
-                    st.write(f"- Signataire: {profile_data['nom_signataire']}")
-                if 'signature_image_path' in profile_data:
-                    st.write("- 📷 Image de signature: ✅")
-                else:
-                    st.write("- 📷 Image de signature: ❌")
-                st.write(f"- Créé: {profile_data['created_date']}")
-                if 'updated_date' in profile_data:
-                    st.write(f"- Modifié: {profile_data['updated_date']}")
-                st.write("---")
+    # Paramètres de la barre latérale enregistrés dans un profil (le placement est dans la session)
+    text_settings = {
+        'text_offset_y': text_offset_y,
+        'text_size': text_size,
+        'page_option': page_option,
+        'custom_pages': custom_pages if page_option == "Pages personnalisées" else "",
+        'inclure_date': inclure_date,
+        'nom_signataire': nom_signataire,
+        'modele_tampon': modele_tampon,
+    }
     
-    # Bouton pour nettoyer tous les profils (en cas de besoin)
-    if signature_profiles:
-        if st.button("🧹 Nettoyer tous les profils", help="Supprimer tous les profils sauvegardés", key="clear_all_profiles"):
-            if st.button("⚠️ Confirmer la suppression", key="confirm_clear"):
-                try:
-                    profiles_file = get_profiles_file_path()
-                    if os.path.exists(profiles_file):
-                        os.remove(profiles_file)
-                    st.success("✅ Tous les profils ont été supprimés!")
-                    st.rerun()
-                except Exception as e:
-                    st.error(f"❌ Erreur: {str(e)}")
+    profile_library(signature_profiles, text_settings, signature_file, active_signature)
+
+# Réglages complets et paramètres de l'overlay (mêmes noms que signing.create_signature_overlay)
+date_sig = date_signature if inclure_date else datetime.now().date()
+profile_settings = dict(text_settings, **placement_settings())
+signature_params = signing.overlay_params_from_profile(profile_settings, date_sig)
+
+# Tampon par page (None sans modèle), complété avec le nom de chaque fichier au traitement
+try:
+    stamp = signing.stamp_params_from_profile(profile_settings, date_sig)
+    stamp_error = None
+except ValueError as e:
+    stamp, stamp_error = None, str(e)
 
 # Zone principale avec onglets
 tab1, tab2 = st.tabs(["📁 Upload & Prévisualisation", "🚀 Traitement"])
@@ -468,186 +912,44 @@ with tab1:
                 )
             else:
                 selected_pdf_index = 0
-    
+        
     with col_main2:
-        st.header("🔍 Prévisualisation PDF")
+        # Manifeste facultatif: un signataire, une position et des pages par fichier
+        manifest_file = st.file_uploader(
+            "📑 Manifeste multi-signataires (facultatif)",
+            type=['csv', 'json'],
+            help="Associe chaque fichier à un profil et/ou à des paramètres (colonnes 'fichier', 'profil', "
+                 "'nom_signataire', 'x_position', 'page_option'...). Les fichiers absents du manifeste "
+                 "utilisent les réglages de la barre latérale.",
+            key="manifest_uploader"
+        )
         
-        # Message d'aide si pas de signature ou nom
-        if not active_signature:
-            st.info("📝 Uploadez une image de signature ou chargez un profil avec image pour voir la prévisualisation")
-        elif not nom_signataire:
-            st.info("👤 Saisissez un nom de signataire pour voir la prévisualisation complète")
-        elif pdf_files and active_signature:
+        manifest_jobs, manifest_groups, manifest_error = None, [], None
+        if manifest_file and pdf_files:
             try:
-                # Sélection du PDF à prévisualiser
-                selected_pdf = pdf_files[selected_pdf_index]
-                
-                # Lecture du PDF sans modifier la position du pointeur
-                pdf_bytes = selected_pdf.getvalue()
-                
-                # Utilisation de PyMuPDF pour convertir en image
-                pdf_document = fitz.open(stream=pdf_bytes)
-                
-                # Déterminer quelle page prévisualiser selon l'option choisie
-                total_pages = len(pdf_document)
-                
-                if page_option == "Première page uniquement":
-                    preview_page_num = 0
-                    preview_info = "Page 1"
-                elif page_option == "Dernière page uniquement":
-                    preview_page_num = total_pages - 1
-                    preview_info = f"Page {total_pages} (dernière)"
-                elif page_option == "Toutes les pages":
-                    preview_page_num = 0  # Montrer la première page comme exemple
-                    preview_info = "Page 1 (signature sur toutes les pages)"
-                elif page_option == "Pages personnalisées" and custom_pages:
-                    # Essayer de montrer la première page spécifiée
-                    pages_to_sign = parse_page_numbers(custom_pages, total_pages)
-                    if pages_to_sign:
-                        preview_page_num = pages_to_sign[0] - 1  # Convertir en 0-indexé
-                        if len(pages_to_sign) == 1:
-                            preview_info = f"Page {pages_to_sign[0]}"
-                        else:
-                            preview_info = f"Page {pages_to_sign[0]} (première des pages sélectionnées: {', '.join(map(str, pages_to_sign))})"
-                    else:
-                        preview_page_num = 0
-                        preview_info = "Page 1 (aucune page valide spécifiée)"
-                else:
-                    preview_page_num = 0
-                    preview_info = "Page 1"
-                
-                # S'assurer que le numéro de page est valide
-                if preview_page_num >= total_pages:
-                    preview_page_num = 0
-                    preview_info = "Page 1 (page demandée non trouvée)"
-                
-                # Obtenir la page à prévisualiser
-                preview_page = pdf_document[preview_page_num]
-                
-                # Conversion en image avec une résolution plus élevée
-                mat = fitz.Matrix(1.5, 1.5)  # Zoom x1.5 pour éviter les images trop lourdes
-                pix = preview_page.get_pixmap(matrix=mat)
-                img_data = pix.tobytes("png")
-                
-                # Chargement de l'image avec PIL
-                pdf_image = Image.open(io.BytesIO(img_data))
-                
-                # Conversion des coordonnées PDF vers coordonnées image
-                pdf_width, pdf_height = preview_page.rect.width, preview_page.rect.height
-                img_width, img_height = pdf_image.size
-                
-                # Facteurs de conversion
-                scale_x = img_width / pdf_width
-                scale_y = img_height / pdf_height
-                
-                # Conversion des coordonnées (PDF: origine en bas à gauche, Image: origine en haut à gauche)
-                img_x = int(x_position * scale_x)
-                img_y = int(img_height - (y_position + signature_height) * scale_y)
-                img_sig_width = int(signature_width * scale_x)
-                img_sig_height = int(signature_height * scale_y)
-                
-                # Création d'une copie pour dessiner la prévisualisation
-                preview_image = pdf_image.copy()
-                draw = ImageDraw.Draw(preview_image)
-                
-                # Dessin du rectangle de signature avec fond semi-transparent
-                # Création d'une overlay pour la transparence
-                overlay = Image.new('RGBA', preview_image.size, (0, 0, 0, 0))
-                overlay_draw = ImageDraw.Draw(overlay)
-                
-                # Rectangle de fond pour la signature
-                overlay_draw.rectangle([img_x, img_y, img_x + img_sig_width, img_y + img_sig_height], 
-                                     fill=(255, 0, 0, 50), outline=(255, 0, 0, 255), width=3)
-                
-                # Fusionner l'overlay avec l'image principale
-                preview_image = preview_image.convert('RGBA')
-                preview_image = Image.alpha_composite(preview_image, overlay)
-                preview_image = preview_image.convert('RGB')
-                
-                # Redessiner le contour
-                draw = ImageDraw.Draw(preview_image)
-                draw.rectangle([img_x, img_y, img_x + img_sig_width, img_y + img_sig_height], 
-                             outline="red", width=3)
-                
-                # Ajout du texte de prévisualisation
-                try:
-                    # Calcul de la taille de police adaptée
-                    font_size = max(10, int(img_sig_height / 5))
-                    font = ImageFont.load_default()
-                except:
-                    font = ImageFont.load_default()
-                
-                if nom_signataire:
-                    text_y = img_y + img_sig_height + int(abs(text_offset_y) * scale_y)
-                    # Formatage du texte avec "Signé par"
-                    signature_text = f"Signé par: {nom_signataire}"
-                    draw.text((img_x, text_y), signature_text, fill="red", font=font)
-                    
-                    if inclure_date:
-                        date_y = text_y + 15
-                        # Format de date DD/MM/YYYY
-                        date_formatted = date_signature.strftime("%d/%m/%Y")
-                        draw.text((img_x, date_y), f"Date: {date_formatted}", fill="red", font=font)
-                
-                # Affichage de l'image avec prévisualisation
-                st.image(preview_image, caption=f"Prévisualisation: {selected_pdf.name} - {preview_info}", use_container_width=True)
-                
-                # Informations détaillées sur la page et position
-                col_info_a, col_info_b = st.columns(2)
-                with col_info_a:
-                    st.info(f"📍 Position signature: X={x_position}px, Y={y_position}px")
-                with col_info_b:
-                    st.info(f"📄 Prévisualisation: {preview_info}")
-                
-                # Information sur les pages qui seront réellement signées
-                if page_option == "Pages personnalisées" and custom_pages:
-                    pages_to_sign = parse_page_numbers(custom_pages, total_pages)
-                    if pages_to_sign:
-                        if len(pages_to_sign) > 1:
-                            st.success(f"✅ Signature sera apposée sur les pages: {', '.join(map(str, pages_to_sign))}")
-                        else:
-                            st.success(f"✅ Signature sera apposée sur la page: {pages_to_sign[0]}")
-                    else:
-                        st.warning("⚠️ Aucune page valide spécifiée")
-                elif page_option == "Toutes les pages":
-                    st.success(f"✅ Signature sera apposée sur toutes les pages (1 à {total_pages})")
-                elif page_option == "Dernière page uniquement":
-                    st.success(f"✅ Signature sera apposée sur la dernière page ({total_pages})")
-                else:
-                    st.success("✅ Signature sera apposée sur la première page")
-                
-                # Aperçu des informations de signature
-                with st.expander("ℹ️ Informations de signature", expanded=False):
-                    col_info1, col_info2 = st.columns(2)
-                    with col_info1:
-                        st.write(f"**📝 Texte:** Signé par: {nom_signataire}")
-                        if inclure_date:
-                            date_formatted = date_signature.strftime("%d/%m/%Y")
-                            st.write(f"**📅 Date:** {date_formatted}")
-                        st.write(f"**📄 Document:** {total_pages} page(s)")
-                    with col_info2:
-                        st.write(f"**📏 Taille texte:** {text_size}px")
-                        st.write(f"**📐 Décalage:** {text_offset_y}px")
-                        st.write(f"**📄 Pages:** {page_option}")
-                        if page_option == "Pages personnalisées" and custom_pages:
-                            st.write(f"**📋 Pages spécifiques:** {custom_pages}")
-                        if st.session_state.current_profile:
-                            st.write(f"**💾 Profil:** {st.session_state.current_profile}")
-                
-                pdf_document.close()
-                
-            except Exception as e:
-                st.error(f"Erreur lors de la prévisualisation: {str(e)}")
-                st.info("💡 Astuce: Assurez-vous que le PDF n'est pas protégé et réessayez.")
-        
-        # Affichage du profil chargé même sans PDF
-        if profile_loaded and not pdf_files:
-            st.info(f"💾 Profil '{selected_profile}' chargé. Uploadez un PDF pour voir la prévisualisation.")
+                entries = parse_manifest_cached(manifest_file.getvalue(), manifest_file.name)
+                manifest_jobs, manifest_missing = manifest.build_jobs(
+                    entries,
+                    [pdf.name for pdf in pdf_files],
+                    signature_profiles,
+                    profile_settings,
+                    active_signature.getvalue() if active_signature else None,
+                    date_sig
+                )
+                manifest_groups = manifest.group_jobs(manifest_jobs)
+                st.success(f"✅ Manifeste: {len(entries)} entrée(s), {len(manifest_groups)} overlay(s) distinct(s)")
+                if manifest_missing:
+                    st.warning(f"⚠️ Fichiers du manifeste non uploadés: {', '.join(manifest_missing)}")
+            except ValueError as e:
+                manifest_error = str(e)
+                st.error(f"❌ Manifeste invalide: {manifest_error}")
 
 with tab2:
     st.header("🚀 Traitement des PDFs")
     
-    # Récapitulatif des paramètres
+    # Récapitulatif des paramètres; la position est affichée par preview_panel, qui la relit à chaque
+    # déplacement des curseurs
+    position_summary = None
     if active_signature and nom_signataire and pdf_files:
         with st.expander("📋 Récapitulatif des paramètres", expanded=True):
             col1, col2, col3 = st.columns(3)
@@ -663,14 +965,13 @@ with tab2:
                     date_formatted = date_signature.strftime("%d/%m/%Y")
                     st.write(f"- Date: {date_formatted}")
                 st.write(f"- Taille texte: {text_size}px")
+                if modele_tampon:
+                    st.write(f"- Tampon par page: {modele_tampon}")
                 if st.session_state.current_profile:
                     st.write(f"- Profil utilisé: {st.session_state.current_profile}")
             
             with col2:
-                st.write("**📍 Position:**")
-                st.write(f"- X: {x_position}px")
-                st.write(f"- Y: {y_position}px")
-                st.write(f"- Taille: {signature_width}x{signature_height}px")
+                position_summary = st.empty()
             
             with col3:
                 st.write("**📁 Fichiers:**")
@@ -684,191 +985,354 @@ with tab2:
                 if len(pdf_files) > 3:
                     st.write(f"  • ... et {len(pdf_files) - 3} autres")
 
+with tab1:
+    preview_panel(pdf_files, selected_pdf_index if pdf_files else 0, active_signature, text_settings, date_sig,
+                  position_summary)
+
+with tab2:
+    if manifest_jobs:
+        with st.expander(f"👥 Groupes du manifeste ({len(manifest_groups)})", expanded=True):
+            st.dataframe(
+                [
+                    {
+                        "Signataire": group['params']['nom'],
+                        "Position": f"{group['params']['x']:g}, {group['params']['y']:g}",
+                        "Taille": f"{group['params']['width']:g}x{group['params']['height']:g}",
+                        "Date": group['params']['date_sig'].strftime("%d/%m/%Y") if group['params']['date_sig'] else "-",
+                        "Tampon": group['stamp']['modele'] if group['stamp'] else "-",
+                        "Origine": ", ".join(group['sources']),
+                        "Fichiers": len(group['files']),
+                        "Noms": ", ".join(group['files']),
+                    }
+                    for group in manifest_groups
+                ],
+                hide_index=True,
+                use_container_width=True
+            )
+            st.caption("Chaque overlay est créé une seule fois; les fichiers de tous les groupes sont signés en parallèle.")
+    
+    with st.expander("⚙️ Options de traitement", expanded=False):
+        streaming_threshold_mb = st.number_input(
+            "Seuil du mode streaming (Mo)",
+            min_value=1,
+            max_value=2000,
+            value=signing.STREAMING_THRESHOLD_MB,
+            help="Les PDFs plus volumineux sont signés par blocs de pages via des fichiers temporaires: seul "
+                 "le bloc en cours est chargé pendant la signature. Dans cette application, le PDF uploadé et le "
+                 "PDF signé restent en mémoire pour le téléchargement; la mémoire constante de bout en bout est "
+                 "celle du démon (watch_folder.py) et du service HTTP (server.py), qui travaillent sur disque"
+        )
+        if pdf_files:
+            large_files = [pdf.name for pdf in pdf_files if pdf.size > streaming_threshold_mb * 1024 * 1024]
+            if large_files:
+                st.info(f"📦 {len(large_files)} fichier(s) seront traités en mode streaming: {', '.join(large_files)}")
+    
+    with st.expander("🔏 Signature numérique (PAdES)", expanded=False):
+        pades_settings = None
+        if not pades.is_available():
+            st.info("Ce mode nécessite pyHanko: `pip install pyhanko`")
+        elif st.checkbox("Ajouter une signature numérique après le tampon visuel", key="pades_enabled"):
+            pades_settings = {
+                'pkcs12': st.file_uploader(
+                    "Certificat et clé (PKCS#12)",
+                    type=['p12', 'pfx'],
+                    help="Chargé et déverrouillé une seule fois pour tout le lot; la clé ne quitte pas le processus principal",
+                    key="pades_pkcs12"
+                ),
+                'passphrase': st.text_input("Mot de passe du certificat", type="password"),
+                'reason': st.text_input("Motif (facultatif)", placeholder="Ex: Approbation"),
+                'location': st.text_input("Lieu (facultatif)", placeholder="Ex: Paris"),
+            }
+            st.caption("Certificat auto-signé de test: `python pades.py --generer-certificat test.p12 --mot-de-passe secret`")
+    
+    with st.expander("📤 Destination des fichiers signés", expanded=False):
+        sink_settings = None
+        sink_choice = st.radio(
+            "Envoyer aussi chaque fichier signé vers:",
+            SINK_OPTIONS,
+            horizontal=True,
+            help="Chaque fichier est envoyé dès qu'il est signé, sans attendre la fin du lot; "
+                 "le téléchargement reste disponible",
+            key="sink_choice"
+        )
+        if sink_choice == SINK_OPTIONS[1]:
+            sink_settings = {
+                'type': "local",
+                'directory': st.text_input("Dossier de sortie", placeholder="Ex: /partage/signes"),
+            }
+        elif sink_choice == SINK_OPTIONS[2]:
+            if not sinks.is_s3_available():
+                st.info("Ce mode nécessite boto3: `pip install boto3`")
+            else:
+                col_s3_1, col_s3_2 = st.columns(2)
+                with col_s3_1:
+                    endpoint_url = st.text_input("Point d'accès (facultatif)", placeholder="Ex: http://127.0.0.1:9000",
+                                                 help="Vide pour AWS; l'adresse du serveur pour MinIO ou un autre stockage compatible")
+                    bucket = st.text_input("Bucket")
+                    prefix = st.text_input("Préfixe (facultatif)", placeholder="Ex: signes/2025")
+                with col_s3_2:
+                    access_key = st.text_input("Clé d'accès (facultatif)",
+                                               help="Vide pour utiliser les identifiants habituels (variables d'environnement, ~/.aws)")
+                    secret_key = st.text_input("Clé secrète (facultatif)", type="password")
+                    region = st.text_input("Région (facultatif)", placeholder="Ex: eu-west-3")
+                sink_settings = {
+                    'type': "s3",
+                    'bucket': bucket,
+                    'prefix': prefix,
+                    'endpoint_url': endpoint_url,
+                    'access_key': access_key,
+                    'secret_key': secret_key,
+                    'region': region,
+                }
+        if sink_settings is not None:
+            sink_settings['max_concurrency'] = st.number_input(
+                "Envois simultanés",
+                min_value=1,
+                max_value=16,
+                value=sinks.MAX_CONCURRENCY,
+                help="Au plus ce nombre de fichiers est en cours d'envoi; le traitement attend qu'un envoi se termine"
+            )
+
 def create_signature_overlay(signature_img, nom, date_sig, x, y, width, height, text_offset, font_size):
     """Crée un PDF overlay avec la signature et les informations"""
-    packet = io.BytesIO()
-    c = canvas.Canvas(packet, pagesize=letter)
-    
     try:
-        # Ajout de l'image de signature
-        if signature_img:
-            # Réinitialiser le pointeur de l'image
-            signature_img.seek(0)
-            # Créer un objet ImageReader pour ReportLab
-            img_reader = ImageReader(signature_img)
-            c.drawImage(img_reader, x, y, width=width, height=height, mask='auto')
-        
-        # Ajout du nom avec "Signé par"
-        if nom:
-            c.setFont("Helvetica", font_size)
-            signature_text = f"Signé par: {nom}"
-            c.drawString(x, y + text_offset, signature_text)
-        
-        # Ajout de la date au format DD/MM/YYYY
-        if date_sig:
-            c.setFont("Helvetica", max(6, font_size - 1))  # Taille légèrement plus petite pour la date
-            date_formatted = date_sig.strftime("%d/%m/%Y")
-            c.drawString(x, y + text_offset - 12, f"Date: {date_formatted}")
-        
-        c.save()
-        packet.seek(0)
-        return packet
-        
+        return signing.create_signature_overlay(signature_img, nom, date_sig, x, y, width, height, text_offset, font_size)
     except Exception as e:
         st.error(f"Erreur lors de la création de l'overlay: {str(e)}")
         return None
 
-def process_pdf(pdf_file, signature_overlay_packet, page_option, custom_pages=""):
-    """Traite un seul PDF en ajoutant la signature sur les pages spécifiées"""
+def process_pdf(pdf_file, signature_overlay_packet, page_option, custom_pages="",
+                streaming_threshold_mb=signing.STREAMING_THRESHOLD_MB, stamp=None):
+    """Traite un seul PDF en ajoutant la signature (et le tampon par page éventuel) sur les pages spécifiées"""
+    if signature_overlay_packet is None:
+        return None
     try:
         # Obtenir les bytes du PDF sans modifier le pointeur
-        pdf_bytes = pdf_file.getvalue()
-        
-        # Lecture du PDF original
-        pdf_reader = PdfReader(io.BytesIO(pdf_bytes))
-        pdf_writer = PdfWriter()
-        
-        # Nombre total de pages
-        total_pages = len(pdf_reader.pages)
-        
-        # Déterminer les pages à signer
-        pages_to_sign = get_pages_to_sign(page_option, custom_pages, total_pages)
-        
-        # Lecture de l'overlay de signature
-        if signature_overlay_packet is None:
-            return None
-            
-        signature_overlay_packet.seek(0)
-        overlay_pdf = PdfReader(signature_overlay_packet)
-        signature_page = overlay_pdf.pages[0]
-        
-        # Traitement de chaque page
-        for page_num in range(total_pages):
-            page = pdf_reader.pages[page_num]
-            
-            # Ajout de la signature sur les pages sélectionnées (conversion 0-indexé)
-            if (page_num + 1) in pages_to_sign:
-                page.merge_page(signature_page)
-            
-            pdf_writer.add_page(page)
-        
-        # Création du PDF résultant
-        output_buffer = io.BytesIO()
-        pdf_writer.write(output_buffer)
-        
-        return output_buffer.getvalue()
-    
+        return signing.sign_pdf_bytes(pdf_file.getvalue(), signature_overlay_packet, page_option, custom_pages,
+                                      streaming_threshold_mb, signing.stamp_for_file(stamp, pdf_file.name))
     except Exception as e:
         st.error(f"Erreur lors du traitement de {pdf_file.name}: {str(e)}")
         return None
 
-# Bouton de traitement
-st.markdown("---")
+def process_manifest_batch(pdf_files, jobs, groups, streaming_threshold_mb, output_sink=None):
+    """Signe un lot multi-signataires: un overlay par groupe, tous les fichiers en parallèle"""
+    documents = {pdf.name: pdf.getvalue() for pdf in pdf_files}
+    progress_bar = st.progress(0)
+    status_text = st.empty()
+    
+    signed = {}
+    results = manifest.sign_groups(groups, jobs, documents, get_process_pool(), streaming_threshold_mb)
+    for done, (name, data, error) in enumerate(results, start=1):
+        if error:
+            st.error(f"Erreur lors du traitement de {name}: {error}")
+        else:
+            signed[name] = data
+            if output_sink:
+                output_sink.submit(f"signed_{name}", data)
+        status_text.text(f"{done}/{len(documents)} fichier(s) traité(s) - {name}")
+        progress_bar.progress(done / len(documents))
+    
+    status_text.empty()
+    progress_bar.empty()
+    # Résultats dans l'ordre de l'upload
+    return [{'name': f"signed_{pdf.name}", 'data': signed[pdf.name]} for pdf in pdf_files if pdf.name in signed]
 
-# Affichage des résultats de traitement s'ils existent
-if st.session_state.processing_complete and st.session_state.processed_files:
-    st.success(f"✅ {len(st.session_state.processed_files)} fichier(s) traité(s) avec succès!")
+def unlock_batch_key(pades_settings):
+    """Déverrouille la clé PKCS#12 une seule fois pour tout le lot et retourne (clé, erreur)"""
+    if pades_settings is None:
+        return None, None
+    if not pades_settings['pkcs12']:
+        return None, "Veuillez fournir le certificat PKCS#12 pour la signature numérique"
+    try:
+        return pades.BatchKey(pades_settings['pkcs12'].getvalue(), pades_settings['passphrase']), None
+    except ValueError as e:
+        return None, str(e)
+
+def add_digital_signatures(processed_files, key, pades_settings, output_sink=None):
+    """Ajoute la signature PAdES aux fichiers tamponnés et retourne (fichiers, latences par fichier)"""
+    if key is None or not processed_files:
+        return processed_files, None
     
-    # Boutons de téléchargement
-    if len(st.session_state.processed_files) > 1:
-        # Création du fichier ZIP
+    progress_bar = st.progress(0)
+    status_text = st.empty()
+    signed = {}
+    report = []
+    documents = [(file_info['name'], file_info['data']) for file_info in processed_files]
+    results = pades.sign_batch(documents, key, get_process_pool(), pades_settings['reason'], pades_settings['location'])
+    for done, (name, data, durations, error) in enumerate(results, start=1):
+        if error:
+            st.error(f"Erreur lors de la signature numérique de {name}: {error}")
+        else:
+            signed[name] = data
+            if output_sink:
+                output_sink.submit(name, data)
+            report.append({
+                'Fichier': name,
+                'Préparation (ms)': round(durations['preparation'] * 1000, 1),
+                'Signature (ms)': round(durations['signature'] * 1000, 1),
+                'Latence (ms)': round(durations['latence'] * 1000, 1),
+            })
+        status_text.text(f"🔏 {done}/{len(documents)} signature(s) numérique(s) - {name}")
+        progress_bar.progress(done / len(documents))
+    
+    status_text.empty()
+    progress_bar.empty()
+    return [dict(file_info, data=signed[file_info['name']]) for file_info in processed_files if file_info['name'] in signed], report
+
+def open_output_sink(sink_settings):
+    """Prépare la destination des fichiers signés avant le traitement et retourne (destination, erreur)"""
+    if sink_settings is None:
+        return None, None
+    try:
+        if sink_settings['type'] == "local":
+            if not sink_settings['directory'].strip():
+                return None, "Veuillez indiquer le dossier de sortie"
+            return sinks.LocalDirectorySink(sink_settings['directory'].strip(), sink_settings['max_concurrency']), None
+        return sinks.S3Sink(
+            sink_settings['bucket'].strip(),
+            sink_settings['prefix'],
+            sink_settings['endpoint_url'].strip(),
+            sink_settings['access_key'].strip(),
+            sink_settings['secret_key'],
+            sink_settings['region'].strip(),
+            max_concurrency=sink_settings['max_concurrency']
+        ), None
+    except ValueError as e:
+        return None, str(e)
+
+def finish_uploads(output_sink):
+    """Attend les derniers envois vers la destination et retourne le rapport par fichier"""
+    if output_sink is None:
+        return None
+    with st.spinner(f"📤 Fin des envois vers {output_sink.label}..."):
+        results = output_sink.close()
+    return {
+        'destination': output_sink.label,
+        'fichiers': [
+            {
+                'Fichier': name,
+                'Emplacement': location or "-",
+                'Durée (ms)': round(duration * 1000, 1) if duration is not None else None,
+                'Erreur': error or "",
+            }
+            for name, location, duration, error in results
+        ],
+    }
+
+def store_results(processed_files, signing_report=None, sink_report=None):
+    """Conserve les fichiers signés dans la session, avec le ZIP construit une seule fois"""
+    if len(processed_files) > 1:
         zip_buffer = io.BytesIO()
         with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            for file_info in st.session_state.processed_files:
+            for file_info in processed_files:
                 zip_file.writestr(file_info['name'], file_info['data'])
-        
-        zip_buffer.seek(0)
-        
-        st.download_button(
-            label="📥 Télécharger tous les PDFs signés (ZIP)",
-            data=zip_buffer.getvalue(),
-            file_name=f"pdfs_signes_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip",
-            mime="application/zip",
-            key="download_zip"
-        )
+        st.session_state.processed_zip = zip_buffer.getvalue()
+        st.session_state.processed_zip_name = f"pdfs_signes_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
     
-    elif len(st.session_state.processed_files) == 1:
-        st.download_button(
-            label="📥 Télécharger le PDF signé",
-            data=st.session_state.processed_files[0]['data'],
-            file_name=st.session_state.processed_files[0]['name'],
-            mime="application/pdf",
-            key="download_single"
-        )
-    
-    # Bouton pour nouveau traitement
-    if st.button("🔄 Nouveau traitement", key="reset"):
-        st.session_state.processed_files = []
-        st.session_state.processing_complete = False
-        st.rerun()
+    st.session_state.processed_files = processed_files
+    st.session_state.signing_report = signing_report
+    st.session_state.sink_report = sink_report
+    st.session_state.processing_complete = True
+
+# Bouton de traitement
+st.markdown("---")
+
+# Affichage des résultats de traitement s'ils existent
+if st.session_state.processing_complete and st.session_state.processed_files:
+    results_panel()
 
 # Bouton de traitement principal
 if not st.session_state.processing_complete:
     if st.button("🚀 Traiter les PDFs", type="primary", use_container_width=True):
-        if not active_signature:
+        if manifest_error:
+            st.error(f"❌ Manifeste invalide: {manifest_error}")
+        elif manifest_jobs is None and not active_signature:
             st.error("❌ Veuillez uploader une image de signature ou charger un profil avec image")
-        elif not nom_signataire:
+        elif manifest_jobs is None and not nom_signataire:
             st.error("❌ Veuillez saisir le nom du signataire")
         elif not pdf_files:
             st.error("❌ Veuillez uploader au moins un fichier PDF")
-        elif page_option == "Pages personnalisées" and not custom_pages.strip():
+        elif manifest_jobs is None and page_option == "Pages personnalisées" and not custom_pages.strip():
             st.error("❌ Veuillez spécifier les pages à signer (ex: 1,3,5 ou 1-3)")
+        elif manifest_jobs is None and stamp_error:
+            st.error(f"❌ Tampon par page: {stamp_error}")
         else:
-            # Traitement des PDFs
-            with st.spinner("🔄 Traitement en cours..."):
-                # Création de l'overlay de signature
-                signature_overlay = create_signature_overlay(
-                    active_signature,
-                    nom_signataire,
-                    date_signature if inclure_date else None,
-                    x_position,
-                    y_position,
-                    signature_width,
-                    signature_height,
-                    text_offset_y,
-                    text_size
-                )
+            # Clé et destination préparées seulement une fois les réglages validés: une destination S3
+            # vérifie le bucket et démarre ses envois dès son ouverture
+            batch_key, key_error = unlock_batch_key(pades_settings)
+            output_sink, sink_error = open_output_sink(sink_settings) if not key_error else (None, None)
+            if key_error:
+                st.error(f"❌ Certificat: {key_error}")
+            elif sink_error:
+                st.error(f"❌ Destination: {sink_error}")
+            else:
+                # Sans signature numérique, chaque fichier part vers la destination dès qu'il est tamponné
+                stamping_sink = output_sink if batch_key is None else None
+                try:
+                    if manifest_jobs:
+                        # Lot multi-signataires décrit par le manifeste
+                        with st.spinner(f"🔄 Traitement de {len(manifest_groups)} groupe(s) en parallèle..."):
+                            processed_files = process_manifest_batch(pdf_files, manifest_jobs, manifest_groups,
+                                                                     streaming_threshold_mb, stamping_sink)
+                            processed_files, signing_report = add_digital_signatures(processed_files, batch_key,
+                                                                                     pades_settings, output_sink)
+                            store_results(processed_files, signing_report, finish_uploads(output_sink))
+                            st.rerun()
+                    else:
+                        # Traitement des PDFs
+                        with st.spinner("🔄 Traitement en cours..."):
+                            # Création de l'overlay de signature
+                            signature_overlay = create_signature_overlay(active_signature, **signature_params)
                 
-                if signature_overlay is None:
-                    st.error("❌ Erreur lors de la création de la signature")
-                else:
-                    processed_files = []
-                    progress_bar = st.progress(0)
-                    status_text = st.empty()
+                            if signature_overlay is None:
+                                st.error("❌ Erreur lors de la création de la signature")
+                            else:
+                                processed_files = []
+                                progress_bar = st.progress(0)
+                                status_text = st.empty()
                     
-                    # Traitement de chaque PDF
-                    for i, pdf_file in enumerate(pdf_files):
-                        status_text.text(f"Traitement de {pdf_file.name}...")
+                                # Traitement de chaque PDF
+                                for i, pdf_file in enumerate(pdf_files):
+                                    status_text.text(f"Traitement de {pdf_file.name}...")
                         
-                        # Reset du pointeur pour l'overlay
-                        signature_overlay.seek(0)
+                                    # Reset du pointeur pour l'overlay
+                                    signature_overlay.seek(0)
                         
-                        # Traitement du PDF avec les options de pages
-                        processed_pdf = process_pdf(
-                            pdf_file, 
-                            signature_overlay, 
-                            page_option, 
-                            custom_pages if page_option == "Pages personnalisées" else ""
-                        )
+                                    # Traitement du PDF avec les options de pages
+                                    processed_pdf = process_pdf(
+                                        pdf_file, 
+                                        signature_overlay, 
+                                        page_option, 
+                                        custom_pages if page_option == "Pages personnalisées" else "",
+                                        streaming_threshold_mb,
+                                        stamp
+                                    )
                         
-                        if processed_pdf:
-                            processed_files.append({
-                                'name': f"signed_{pdf_file.name}",
-                                'data': processed_pdf
-                            })
+                                    if processed_pdf:
+                                        processed_files.append({
+                                            'name': f"signed_{pdf_file.name}",
+                                            'data': processed_pdf
+                                        })
+                                        if stamping_sink:
+                                            stamping_sink.submit(f"signed_{pdf_file.name}", processed_pdf)
                         
-                        # Mise à jour de la barre de progression
-                        progress_bar.progress((i + 1) / len(pdf_files))
+                                    # Mise à jour de la barre de progression
+                                    progress_bar.progress((i + 1) / len(pdf_files))
                     
-                    # Stockage des résultats dans la session
-                    st.session_state.processed_files = processed_files
-                    st.session_state.processing_complete = True
+                                # Signature numérique éventuelle, fin des envois puis stockage des résultats dans la session
+                                processed_files, signing_report = add_digital_signatures(processed_files, batch_key,
+                                                                                         pades_settings, output_sink)
+                                store_results(processed_files, signing_report, finish_uploads(output_sink))
                     
-                    status_text.empty()
-                    progress_bar.empty()
+                                status_text.empty()
+                                progress_bar.empty()
                     
-                    # Recharger la page pour afficher les résultats
-                    st.rerun()
+                                # Recharger la page pour afficher les résultats
+                                st.rerun()
+                finally:
+                    # Envois en cours terminés et ressources libérées même si le traitement échoue
+                    if output_sink:
+                        output_sink.close()
 
 # Section d'aide
 with st.expander("❓ Aide et conseils"):
@@ -877,7 +1341,7 @@ with st.expander("❓ Aide et conseils"):
     
     1. **Profils**: Créez et sauvegardez vos configurations de signature
     2. **Image de signature**: Uploadez une image PNG, JPG ou JPEG de votre signature
-    3. **Position**: Ajustez la position X/Y et la taille de la signature
+    3. **Position**: Ajustez la position X/Y et la taille de la signature à côté de la prévisualisation; les miniatures et la grille du lot suivent les curseurs
     4. **Pages**: Choisissez quelles pages signer (première, dernière, toutes, ou personnalisées)
     5. **Prévisualisation**: Visualisez exactement où sera placée la signature
     6. **Informations**: Saisissez votre nom et choisissez d'inclure la date
@@ -911,6 +1375,54 @@ with st.expander("❓ Aide et conseils"):
       - "Paraphe toutes pages": Petit format, toutes les pages + image
       - "Validation contrat": Pages 1 et dernière page + image
     
+    ### 🏷️ Tampon par page:
+    
+    - **Texte variable**: Ajouté sous le nom et la date de chaque page signée, ex: `Paraphe - page {page}/{total}`
+    - **Champs**: `{page}`, `{total}`, `{fichier}`, `{nom}`, `{date}`, `{heure}` et les champs du profil
+      (`{nom_signataire}`, `{custom_pages}`...)
+    - **Performances**: Toutes les variantes d'un document sont rendues en une seule fois; l'image et le texte
+      fixes sont partagés par toutes les pages
+    - **Profils**: Le modèle est sauvegardé avec le profil et utilisable dans le manifeste, le serveur et le démon
+    
+    ### 📑 Manifeste multi-signataires:
+    
+    - **Un seul traitement pour plusieurs signataires**: Uploadez un CSV ou un JSON à côté des PDFs
+    - **Colonnes**: `fichier` (obligatoire), `profil` (profil sauvegardé), puis les paramètres à remplacer:
+      `nom_signataire`, `x_position`, `y_position`, `signature_width`, `signature_height`,
+      `text_offset_y`, `text_size`, `page_option`, `custom_pages`, `inclure_date`, `modele_tampon`
+    - **Exemple CSV**: `fichier;profil;nom_signataire` puis `contrat.pdf;Direction;Marie Curie`
+    - **Cellules vides**: La valeur du profil (ou de la barre latérale) est conservée
+    - **Fichiers non listés**: Signés avec les réglages de la barre latérale
+    - **Groupes**: Les fichiers au même overlay sont regroupés, chaque overlay n'est créé qu'une fois
+      et tous les groupes sont signés en parallèle
+    - **Prévisualisation**: Elle utilise les réglages de la barre latérale, pas ceux du manifeste
+    
+    ### 🔏 Signature numérique (PAdES):
+    
+    - **Mode facultatif**: Ajoute une vraie signature électronique après le tampon visuel (nécessite pyHanko)
+    - **Certificat**: Fichier PKCS#12 (.p12 / .pfx) et son mot de passe, chargé une seule fois par lot
+    - **Parallélisme**: Les documents sont préparés et leur empreinte calculée en parallèle
+    - **Latences**: Le détail par fichier est affiché avec les résultats
+    - **Test**: `python pades.py --generer-certificat test.p12 --nom "Jean Dupont" --mot-de-passe secret`
+    
+    ### 📤 Destination des fichiers signés:
+    
+    - **Dossier local**: Chaque fichier signé est aussi écrit dans un dossier (local ou partagé)
+    - **Stockage S3**: Envoi vers un bucket AWS S3 ou compatible (MinIO...) avec boto3; les gros fichiers
+      sont envoyés en plusieurs parties
+    - **Au fil de l'eau**: Chaque fichier part dès qu'il est signé, avec un nombre borné d'envois simultanés
+    - **Téléchargement**: Les boutons de téléchargement restent disponibles
+    - **Rapport**: L'emplacement et la durée de chaque envoi sont affichés avec les résultats
+    
+    ### 📦 Gros fichiers:
+    
+    - **Mode streaming**: Au-delà du seuil choisi dans les options de traitement, un PDF est signé par blocs
+      de pages via des fichiers temporaires
+    - **Mémoire de l'application**: Les PDFs uploadés et signés restent en mémoire (session et ZIP) pour le
+      téléchargement, même en mode streaming
+    - **Très gros lots**: Le démon `watch_folder.py` et le service `server.py` lisent et écrivent sur disque,
+      avec une mémoire constante quelle que soit la taille des fichiers
+    
     ### 📄 Options de pages:
     
     - **Première page uniquement**: Signature sur la page 1 seulement
@@ -924,10 +1436,13 @@ with st.expander("❓ Aide et conseils"):
     ### 🎯 Fonctionnalités de prévisualisation:
     
     - **Aperçu en temps réel**: Voyez la position exacte sur votre PDF
-    - **Rectangle rouge**: Indique l'emplacement de la signature
-    - **Texte rouge**: Position du nom et de la date
+    - **Rendu final**: La page prévisualisée avec la signature telle qu'elle sera apposée
+    - **Cadre indicatif**: Rectangle rouge indiquant l'emplacement de la signature (plus rapide)
+    - **Texte rouge**: Position du nom et de la date en mode cadre indicatif
     - **Sélection de PDF**: Choisissez quel PDF prévisualiser si vous en avez plusieurs
     - **Expander d'infos**: Détails sur la signature dans la prévisualisation
+    - **Miniatures**: Toutes les pages du PDF sélectionné, les pages signées étant affichées avec la signature et le tampon
+    - **Contrôle du lot**: La première page signée de chaque fichier, pour repérer un mauvais placement
     
     ### 🔧 Résolution des problèmes:
     
@@ -940,5 +1455,5 @@ with st.expander("❓ Aide et conseils"):
 
 # Footer
 st.markdown("---")
-st.markdown("🔒 Tous les fichiers sont traités localement et ne sont pas stockés sur le serveur.")
+st.markdown("🔒 Tous les fichiers sont traités localement et ne sont conservés que si une destination (dossier local ou stockage S3) est choisie.")
 st.markdown("Made with ❤️ by Jellyfish - 2025")
@@ -0,0 +1,222 @@
+"""Mesure de la latence de rerun par interaction
+
+Utilisation:
+    python bench_reruns.py [--app app.py] [--fichiers 20] [--pages 30] [--repetitions 5]
+
+Le script crée un profil et des PDFs de test dans un répertoire temporaire, pilote l'application avec
+AppTest (Streamlit récent, pour l'upload de fichiers) et mesure chaque interaction:
+- "rerun complet": durée d'exécution de tout le script après l'interaction;
+- "section": durée de la fonction du fragment qui contient le widget, chronométrée pendant ce même
+  rerun complet. AppTest réexécute toujours tout le script: ce n'est pas une mesure d'un rerun de
+  fragment dans le navigateur, seulement une estimation de sa part de calcul.
+
+Le chronométrage est ajouté par ce script (st.fragment est remplacé avant le lancement de l'application),
+l'application elle-même n'est pas instrumentée.
+"""
+import argparse
+import functools
+import io
+import json
+import os
+import statistics
+import tempfile
+import time
+
+# Ordre d'affichage des interactions mesurées
+INTERACTIONS = [
+    "Position X",
+    "Changement de profil",
+    "Choix du PDF prévisualisé",
+    "Mode de prévisualisation",
+    "Groupe de miniatures",
+    "Grille de contrôle du lot",
+    "Nom du profil à sauvegarder",
+    "Position X avec résultats affichés",
+]
+
+def create_fixtures(root, file_count, page_count):
+    """Crée un profil avec image de signature et des PDFs de test"""
+    from PIL import Image
+    from reportlab.pdfgen import canvas
+
+    profiles_dir = os.path.join(root, ".streamlit_pdf_signature")
+    os.makedirs(profiles_dir)
+    image_path = os.path.join(profiles_dir, "signature_bench.png")
+    Image.new("RGBA", (300, 120), (20, 40, 160, 200)).save(image_path)
+
+    base_profile = {
+        'x_position': 400, 'y_position': 100, 'signature_width': 120, 'signature_height': 60,
+        'text_offset_y': -20, 'text_size': 8, 'page_option': "Toutes les pages", 'custom_pages': "",
+        'inclure_date': True, 'nom_signataire': "Jean Dupont", 'signature_image_path': image_path,
+        'created_date': "01/01/2025 00:00",
+    }
+    profiles = {
+        'bench': base_profile,
+        'bench 2': dict(base_profile, x_position=100, page_option="Première page uniquement"),
+    }
+    with open(os.path.join(profiles_dir, "signature_profiles.json"), 'w', encoding='utf-8') as f:
+        json.dump(profiles, f)
+
+    pdfs = []
+    for i in range(file_count):
+        buffer = io.BytesIO()
+        c = canvas.Canvas(buffer)
+        for page in range(page_count):
+            c.drawString(72, 720, f"Document {i + 1} - page {page + 1}")
+            c.showPage()
+        c.save()
+        pdfs.append((f"document_{i + 1:03d}.pdf", buffer.getvalue(), "application/pdf"))
+    return pdfs
+
+# Durée de la dernière exécution de chaque fragment, par nom de fonction
+SECTION_TIMINGS = {}
+
+def instrument_fragments():
+    """Remplace st.fragment par une version qui chronomètre chaque exécution des fragments"""
+    import streamlit as st
+
+    fragment = st.fragment
+
+    def timed_fragment(func=None, **kwargs):
+        if func is None:
+            return lambda f: timed_fragment(f, **kwargs)
+
+        @functools.wraps(func)
+        def wrapper(*args, **func_kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **func_kwargs)
+            finally:
+                SECTION_TIMINGS[func.__name__] = time.perf_counter() - start
+        return fragment(wrapper, **kwargs)
+
+    st.fragment = timed_fragment
+
+def find(widgets, label):
+    """Retourne le widget portant ce libellé, ou None"""
+    for widget in widgets:
+        if widget.label == label:
+            return widget
+    return None
+
+def timed_run(at):
+    SECTION_TIMINGS.clear()
+    start = time.perf_counter()
+    at.run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    return time.perf_counter() - start
+
+def measure(app_path, pdfs, repetitions):
+    """Mesure chaque interaction et retourne {interaction: (rerun complet, section)}"""
+    from streamlit.testing.v1 import AppTest
+
+    instrument_fragments()
+    at = AppTest.from_file(app_path, default_timeout=300)
+    at.run()
+    at.selectbox(key="profile_selector").select("bench")
+    at.run()
+    at.file_uploader(key="pdf_uploader").set_value(pdfs)
+    at.run()
+
+    results = {}
+
+    def record(name, section, interact):
+        full, section_times = [], []
+        for i in range(repetitions):
+            if not interact(at, i):
+                return
+            full.append(timed_run(at))
+            if section and section in SECTION_TIMINGS:
+                section_times.append(SECTION_TIMINGS[section])
+        results[name] = (statistics.median(full), statistics.median(section_times) if section_times else None)
+
+    def slider_x(at, i):
+        at.slider(key="placement_x").set_value(300 + i * 7)
+        return True
+
+    def switch_profile(at, i):
+        at.selectbox(key="profile_selector").select("bench 2" if i % 2 == 0 else "bench")
+        return True
+
+    def select_pdf(at, i):
+        widget = find(at.selectbox, "📖 Choisir le PDF à prévisualiser:")
+        if widget is None:
+            return False
+        widget.set_value((i + 1) % len(pdfs))
+        return True
+
+    def preview_mode(at, i):
+        widget = find(at.radio, "Mode de prévisualisation")
+        if widget is None:
+            return False
+        widget.set_value(widget.options[(i + 1) % 2])
+        return True
+
+    def thumbnail_window(at, i):
+        widget = next((w for w in at.number_input if w.label.startswith("Groupe de miniatures")), None)
+        if widget is None:
+            return False
+        widget.set_value(i % 2 + 1)
+        return True
+
+    def batch_grid(at, i):
+        widget = next((w for w in at.checkbox if w.label.startswith("Afficher la première page signée")), None)
+        if widget is None:
+            return False
+        widget.set_value(i % 2 == 0)
+        return True
+
+    def profile_name(at, i):
+        widget = find(at.text_input, "Nom du profil:")
+        if widget is None:
+            return False
+        widget.set_value(f"bench {i}")
+        return True
+
+    record("Position X", "preview_panel", slider_x)
+    record("Changement de profil", None, switch_profile)
+    at.selectbox(key="profile_selector").select("bench")
+    at.run()
+    record("Choix du PDF prévisualisé", None, select_pdf)
+    record("Mode de prévisualisation", "preview_panel", preview_mode)
+    record("Groupe de miniatures", "thumbnail_strip", thumbnail_window)
+    record("Grille de contrôle du lot", "batch_grid", batch_grid)
+    batch_grid(at, 1)
+    at.run()
+    record("Nom du profil à sauvegarder", "profile_library", profile_name)
+
+    # Traitement du lot puis interaction avec les résultats affichés
+    find(at.button, "🚀 Traiter les PDFs").click()
+    at.run()
+    record("Position X avec résultats affichés", "preview_panel", slider_x)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Latence de rerun par interaction")
+    parser.add_argument("--app", default="app.py", help="Script Streamlit à mesurer")
+    parser.add_argument("--fichiers", type=int, default=20, help="Nombre de PDFs uploadés")
+    parser.add_argument("--pages", type=int, default=30, help="Pages par PDF")
+    parser.add_argument("--repetitions", type=int, default=5, help="Mesures par interaction")
+    args = parser.parse_args()
+
+    app_path = os.path.abspath(args.app)
+    with tempfile.TemporaryDirectory() as home:
+        pdfs = create_fixtures(home, args.fichiers, args.pages)
+        os.environ["HOME"] = home
+        results = measure(app_path, pdfs, args.repetitions)
+
+    print(f"Latence de rerun (médiane, {args.fichiers} PDFs de {args.pages} pages):")
+    print(f"  {'Interaction':<38}{'rerun complet':>15}{'section':>12}")
+    for name in INTERACTIONS:
+        if name not in results:
+            print(f"  {name:<38}{'non disponible':>15}")
+            continue
+        full, section = results[name]
+        section_text = f"{section * 1000:9.1f} ms" if section is not None else f"{'-':>12}"
+        print(f"  {name:<38}{full * 1000:12.1f} ms{section_text}")
+    print("  (section: durée du fragment chronométrée dans le rerun complet, estimation et non mesure")
+    print("   d'un rerun de fragment)")
+
+if __name__ == "__main__":
+    main()
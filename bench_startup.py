@@ -0,0 +1,76 @@
+"""Mesure du démarrage de l'application: temps d'import et temps jusqu'au premier rendu
+
+Utilisation:
+    python bench_startup.py [--repetitions 5] [--app app.py]
+
+Chaque mesure est faite dans un nouveau processus Python (démarrage à froid).
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ["streamlit", "PyPDF2", "reportlab.pdfgen.canvas", "fitz", "PIL.Image", "numpy"]
+
+# Script exécuté dans le processus enfant pour mesurer le premier rendu
+FIRST_RENDER_SCRIPT = r"""
+import json, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+imported = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=120)
+at.run()
+first_render = time.perf_counter()
+at.run()
+rerun = time.perf_counter()
+print(json.dumps({
+    'streamlit_import': imported - start,
+    'first_render': first_render - imported,
+    'rerun': rerun - first_render,
+    'exception': [str(e.value) for e in at.exception],
+    'loaded': [name for name in sys.argv[2:] if name in sys.modules],
+}))
+"""
+
+IMPORT_SCRIPT = r"""
+import sys, time
+start = time.perf_counter()
+__import__(sys.argv[1])
+print(time.perf_counter() - start)
+"""
+
+def run_child(script, *args):
+    """Exécute un script dans un nouveau processus et retourne sa sortie standard"""
+    result = subprocess.run([sys.executable, "-c", script, *args], capture_output=True, text=True, check=True)
+    return result.stdout.strip().splitlines()[-1]
+
+def median_ms(values):
+    return f"{statistics.median(values) * 1000:8.1f} ms"
+
+def main():
+    parser = argparse.ArgumentParser(description="Mesure du démarrage à froid de l'application")
+    parser.add_argument("--app", default="app.py", help="Script Streamlit à mesurer")
+    parser.add_argument("--repetitions", type=int, default=5, help="Nombre de mesures par indicateur")
+    args = parser.parse_args()
+
+    print("Temps d'import isolé des modules lourds (médiane):")
+    for module in HEAVY_MODULES:
+        try:
+            timings = [float(run_child(IMPORT_SCRIPT, module)) for _ in range(args.repetitions)]
+            print(f"  {module:<26}{median_ms(timings)}")
+        except subprocess.CalledProcessError:
+            print(f"  {module:<26}  non installé")
+
+    runs = [json.loads(run_child(FIRST_RENDER_SCRIPT, args.app, *HEAVY_MODULES)) for _ in range(args.repetitions)]
+    if runs[0]['exception']:
+        print(f"Exception pendant le rendu: {runs[0]['exception']}")
+
+    print(f"\nDémarrage de {args.app} (médiane sur {args.repetitions} processus):")
+    print(f"  {'Import de streamlit':<26}{median_ms([r['streamlit_import'] for r in runs])}")
+    print(f"  {'Premier rendu':<26}{median_ms([r['first_render'] for r in runs])}")
+    print(f"  {'Rerun suivant':<26}{median_ms([r['rerun'] for r in runs])}")
+    print(f"  Modules lourds chargés après le premier rendu: {', '.join(runs[0]['loaded']) or 'aucun'}")
+
+if __name__ == "__main__":
+    main()
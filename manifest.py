@@ -0,0 +1,199 @@
+"""Lots multi-signataires décrits par un manifeste CSV ou JSON
+
+Chaque entrée associe un fichier à un profil sauvegardé et/ou à des paramètres explicites
+(mêmes noms que les champs d'un profil):
+
+    fichier;profil;nom_signataire;x_position
+    contrat_a.pdf;Direction;;
+    contrat_b.pdf;Direction;Marie Curie;350
+    annexe.pdf;;Jean Dupont;
+
+En JSON: une liste d'objets avec les mêmes clés, ou un objet {"contrat_a.pdf": "Direction", "annexe.pdf": {...}}.
+
+Les fichiers dont l'overlay est identique forment un groupe: l'overlay est créé une seule fois par groupe
+et les fichiers de tous les groupes sont signés en parallèle dans le même traitement.
+"""
+import csv
+import hashlib
+import io
+import json
+from concurrent.futures import as_completed
+from datetime import datetime
+
+import signing
+
+FILE_COLUMN = "fichier"
+PROFILE_COLUMN = "profil"
+
+def _csv_rows(text):
+    """Retourne les lignes d'un manifeste CSV (séparateur , ; ou tabulation détecté sur l'en-tête)"""
+    header = text.splitlines()[0] if text.strip() else ""
+    try:
+        dialect = csv.Sniffer().sniff(header, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.DictReader(io.StringIO(text), dialect=dialect)
+    rows = []
+    for row in reader:
+        rows.append((f"Ligne {reader.line_num}", row))
+    return rows
+
+def _json_rows(content):
+    """Retourne les entrées d'un manifeste JSON (liste d'objets ou objet indexé par nom de fichier)"""
+    if isinstance(content, dict):
+        content = [
+            dict(value, **{FILE_COLUMN: name}) if isinstance(value, dict) else {FILE_COLUMN: name, PROFILE_COLUMN: value}
+            for name, value in content.items()
+        ]
+    if not isinstance(content, list):
+        raise ValueError("Le manifeste JSON doit être une liste d'entrées ou un objet indexé par nom de fichier")
+    return [(f"Entrée {i + 1}", row) for i, row in enumerate(content)]
+
+def parse_manifest(data, filename=""):
+    """Lit un manifeste CSV ou JSON et retourne la liste des entrées {fichier, profil, parametres}"""
+    text = data.decode("utf-8-sig")
+    if filename.lower().endswith(".json") or text.lstrip().startswith(("[", "{")):
+        try:
+            rows = _json_rows(json.loads(text))
+        except json.JSONDecodeError as e:
+            raise ValueError(f"JSON invalide: {e}")
+    else:
+        rows = _csv_rows(text)
+
+    entries = []
+    seen = set()
+    for label, row in rows:
+        if not isinstance(row, dict):
+            raise ValueError(f"{label}: entrée invalide")
+        # Les cellules en trop d'une ligne CSV sont rangées sous la clé None
+        row = {str(key).strip(): value for key, value in row.items() if key is not None}
+        unknown = set(row) - {FILE_COLUMN, PROFILE_COLUMN} - set(signing.PROFILE_FIELDS)
+        if unknown:
+            raise ValueError(f"{label}: colonne(s) inconnue(s): {', '.join(sorted(unknown))}")
+
+        name = str(row.get(FILE_COLUMN) or "").strip()
+        if not name:
+            raise ValueError(f"{label}: nom de fichier manquant (colonne '{FILE_COLUMN}')")
+        if name in seen:
+            raise ValueError(f"{label}: le fichier '{name}' apparaît plusieurs fois")
+        seen.add(name)
+
+        # Les cellules vides gardent la valeur du profil ou des réglages de base
+        params = {}
+        for key, convert in signing.PROFILE_FIELDS.items():
+            value = row.get(key)
+            if isinstance(value, str):
+                value = value.strip()
+            if value is None or value == "":
+                continue
+            try:
+                params[key] = convert(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"{label}: valeur invalide pour '{key}': {value}")
+        if params.get('page_option', signing.PAGE_OPTIONS[0]) not in signing.PAGE_OPTIONS:
+            raise ValueError(f"{label}: option de pages inconnue: {params['page_option']}")
+
+        profile = str(row.get(PROFILE_COLUMN) or "").strip()
+        entries.append({'fichier': name, 'profil': profile or None, 'parametres': params})
+    return entries
+
+def build_jobs(entries, filenames, profiles, base_settings, base_signature, date_sig):
+    """Détermine les paramètres complets de chaque fichier à signer
+
+    Un fichier du manifeste part de son profil (ou des réglages de base) puis reçoit ses paramètres
+    explicites; un fichier absent du manifeste garde les réglages de base. Retourne (jobs, manquants):
+    jobs = {fichier: {'signature', 'params', 'page_option', 'custom_pages', 'stamp', 'source'}} et
+    manquants = fichiers du manifeste qui ne font pas partie du lot.
+    """
+    by_name = {entry['fichier']: entry for entry in entries}
+    # Heure commune à tout le lot pour que les tampons identiques restent dans le même groupe
+    now = datetime.now()
+    profile_signatures = {}
+    jobs = {}
+    for name in filenames:
+        entry = by_name.get(name)
+        settings = dict(base_settings)
+        signature = base_signature
+        source = "Réglages actuels"
+        if entry:
+            source = "Manifeste"
+            if entry['profil']:
+                if entry['profil'] not in profiles:
+                    raise ValueError(f"{name}: profil '{entry['profil']}' introuvable")
+                settings = dict(profiles[entry['profil']])
+                if entry['profil'] not in profile_signatures:
+                    profile_signatures[entry['profil']] = signing.read_signature_bytes(
+                        settings.get('signature_image_path'))
+                signature = profile_signatures[entry['profil']] or base_signature
+                source = entry['profil']
+            settings.update(entry['parametres'])
+
+        if not signature:
+            raise ValueError(f"{name}: aucune image de signature")
+        if not settings.get('nom_signataire'):
+            raise ValueError(f"{name}: nom du signataire manquant")
+
+        try:
+            stamp = signing.stamp_params_from_profile(settings, date_sig, now)
+        except ValueError as e:
+            raise ValueError(f"{name}: {e}")
+
+        page_option = settings.get('page_option', "Première page uniquement")
+        jobs[name] = {
+            'signature': signature,
+            'params': signing.overlay_params_from_profile(settings, date_sig),
+            'page_option': page_option,
+            'custom_pages': settings.get('custom_pages', "") if page_option == "Pages personnalisées" else "",
+            'stamp': stamp,
+            'source': source,
+        }
+
+    missing = [entry['fichier'] for entry in entries if entry['fichier'] not in jobs]
+    return jobs, missing
+
+def group_jobs(jobs):
+    """Regroupe les fichiers dont l'image, les paramètres d'overlay et le tampon par page sont identiques"""
+    groups = {}
+    for name, job in jobs.items():
+        key = (hashlib.sha1(job['signature']).hexdigest(), tuple(sorted(job['params'].items())),
+               json.dumps(job['stamp'], sort_keys=True, default=str))
+        group = groups.setdefault(key, {'signature': job['signature'], 'params': job['params'], 'stamp': job['stamp'],
+                                        'sources': [], 'files': []})
+        if job['source'] not in group['sources']:
+            group['sources'].append(job['source'])
+        group['files'].append(name)
+    return list(groups.values())
+
+def sign_entry(pdf_bytes, overlay_bytes, page_option, custom_pages, streaming_threshold_mb, stamp=None):
+    """Signe un fichier du lot avec l'overlay de son groupe (exécuté dans un worker)"""
+    return signing.sign_pdf_bytes(pdf_bytes, io.BytesIO(overlay_bytes), page_option, custom_pages,
+                                  streaming_threshold_mb, stamp)
+
+def sign_groups(groups, jobs, documents, executor, streaming_threshold_mb=signing.STREAMING_THRESHOLD_MB):
+    """Crée l'overlay de chaque groupe une seule fois puis signe tous les fichiers en parallèle
+
+    `documents` associe chaque nom de fichier à ses octets. Produit (fichier, octets signés, erreur)
+    au fur et à mesure des fins de traitement.
+    """
+    futures = {}
+    for group in groups:
+        try:
+            packet = signing.create_signature_overlay(io.BytesIO(group['signature']), **group['params'])
+        except Exception as e:
+            for name in group['files']:
+                yield name, None, f"Erreur lors de la création de l'overlay: {str(e)}"
+            continue
+        overlay_bytes = packet.getvalue()
+        for name in group['files']:
+            job = jobs[name]
+            future = executor.submit(sign_entry, documents[name], overlay_bytes, job['page_option'],
+                                     job['custom_pages'], streaming_threshold_mb,
+                                     signing.stamp_for_file(group['stamp'], name))
+            futures[future] = name
+
+    for future in as_completed(futures):
+        name = futures[future]
+        try:
+            yield name, future.result(), None
+        except Exception as e:
+            yield name, None, str(e)
@@ -0,0 +1,210 @@
+"""Signature numérique PAdES (CMS détaché) ajoutée après le tampon visuel
+
+pyHanko est une dépendance facultative (pip install pyhanko), importée seulement quand le mode est utilisé.
+
+La clé PKCS#12 est chargée et déverrouillée une seule fois par lot, dans le processus principal. Les workers
+préparent chaque document sans jamais recevoir la clé: champ de signature, réservation du /Contents et
+empreinte du ByteRange. Le processus principal signe ensuite les attributs (quelques millisecondes par
+fichier) et insère la signature CMS dans l'emplacement réservé.
+
+Certificat auto-signé pour les tests:
+    python pades.py --generer-certificat test.p12 --nom "Jean Dupont" --mot-de-passe secret
+"""
+import argparse
+import asyncio
+import importlib.util
+import io
+import time
+from concurrent.futures import as_completed
+
+MD_ALGORITHM = "sha256"
+FIELD_PREFIX = "Signature"
+
+def is_available():
+    """Indique si pyHanko est installé"""
+    return importlib.util.find_spec("pyhanko") is not None
+
+class BatchKey:
+    """Clé PKCS#12 déverrouillée une seule fois pour tout un lot"""
+
+    def __init__(self, pkcs12_bytes, passphrase=""):
+        from asn1crypto import x509
+        from cryptography.hazmat.primitives.asymmetric import ec, rsa
+        from cryptography.hazmat.primitives.serialization import Encoding, pkcs12
+        from pyhanko_certvalidator.registry import SimpleCertificateStore
+
+        try:
+            private_key, certificate, chain = pkcs12.load_key_and_certificates(
+                pkcs12_bytes, passphrase.encode("utf-8") if passphrase else None
+            )
+        except ValueError:
+            raise ValueError("Fichier PKCS#12 invalide ou mot de passe incorrect")
+        if private_key is None or certificate is None:
+            raise ValueError("Le fichier PKCS#12 doit contenir une clé privée et son certificat")
+
+        if isinstance(private_key, rsa.RSAPrivateKey):
+            self.signature_size = private_key.key_size // 8
+        elif isinstance(private_key, ec.EllipticCurvePrivateKey):
+            # Signature ECDSA encodée en DER: deux entiers plus l'en-tête
+            self.signature_size = 2 * ((private_key.key_size + 7) // 8) + 9
+        else:
+            raise ValueError("Seules les clés RSA et ECDSA sont prises en charge")
+
+        # La clé déchiffrée est gardée telle quelle: pas de nouveau décodage à chaque signature
+        self.private_key = private_key
+        # Données transmises aux workers: certificats publics et taille de la signature, jamais la clé
+        self.certificate_der = certificate.public_bytes(Encoding.DER)
+        self.chain_der = [cert.public_bytes(Encoding.DER) for cert in chain or []]
+        self.certificate = x509.Certificate.load(self.certificate_der)
+        self.registry = SimpleCertificateStore.from_certs(
+            [self.certificate] + [x509.Certificate.load(der) for der in self.chain_der]
+        )
+        self.subject = self.certificate.subject.human_friendly
+
+    def worker_args(self):
+        """Arguments publics passés aux workers pour préparer les documents"""
+        return self.certificate_der, self.chain_der, self.signature_size
+
+    def sign(self, data):
+        """Signe des octets avec la clé du lot (SHA-256, PKCS#1 v1.5 ou ECDSA)"""
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import ec, padding
+
+        if isinstance(self.private_key, ec.EllipticCurvePrivateKey):
+            return self.private_key.sign(data, ec.ECDSA(hashes.SHA256()))
+        return self.private_key.sign(data, padding.PKCS1v15(), hashes.SHA256())
+
+def _free_field_name(handler):
+    """Retourne un nom de champ de signature absent du document"""
+    from pyhanko.sign.fields import enumerate_sig_fields
+
+    existing = {name for name, _, _ in enumerate_sig_fields(handler)}
+    index = 1
+    while f"{FIELD_PREFIX}{index}" in existing:
+        index += 1
+    return f"{FIELD_PREFIX}{index}"
+
+def prepare_document(pdf_bytes, certificate_der, chain_der, signature_size, reason=None, location=None):
+    """Ajoute le champ de signature et calcule l'empreinte du ByteRange (exécuté dans un worker)
+
+    Retourne (PDF préparé, empreinte préparée, attributs signés DER, durée en secondes).
+    """
+    from asn1crypto import x509
+    from pyhanko.pdf_utils.incremental_writer import IncrementalPdfFileWriter
+    from pyhanko.sign import fields, signers
+    from pyhanko_certvalidator.registry import SimpleCertificateStore
+
+    start = time.perf_counter()
+    certificate = x509.Certificate.load(certificate_der)
+    registry = SimpleCertificateStore.from_certs([certificate] + [x509.Certificate.load(der) for der in chain_der])
+    # Signataire sans clé: sert uniquement à dimensionner la réservation et à construire les attributs signés
+    external_signer = signers.ExternalSigner(certificate, registry, signature_value=signature_size)
+
+    writer = IncrementalPdfFileWriter(io.BytesIO(pdf_bytes), strict=False)
+    metadata = signers.PdfSignatureMetadata(
+        field_name=_free_field_name(writer),
+        md_algorithm=MD_ALGORITHM,
+        subfilter=fields.SigSeedSubFilter.PADES,
+        reason=reason or None,
+        location=location or None,
+    )
+    pdf_signer = signers.PdfSigner(metadata, signer=external_signer)
+
+    async def digest():
+        prepared_digest, _, output = await pdf_signer.async_digest_doc_for_signing(writer)
+        signed_attrs = await external_signer.signed_attrs(
+            prepared_digest.document_digest, MD_ALGORITHM, use_pades=True
+        )
+        return prepared_digest, output, signed_attrs
+
+    prepared_digest, output, signed_attrs = asyncio.run(digest())
+    return output.getvalue(), prepared_digest, signed_attrs.dump(), time.perf_counter() - start
+
+def finish_document(prepared_pdf, prepared_digest, signed_attrs_der, key):
+    """Signe les attributs avec la clé du lot et insère la signature CMS dans l'emplacement réservé"""
+    from asn1crypto import cms
+    from pyhanko.sign import signers
+    from pyhanko.sign.signers.pdf_signer import PdfTBSDocument
+
+    # La signature brute est calculée ici; pyHanko ne fait qu'assembler la structure CMS
+    signer = signers.ExternalSigner(key.certificate, key.registry, signature_value=key.sign(signed_attrs_der))
+
+    async def sign():
+        signature_cms = await signer.async_sign_prescribed_attributes(
+            MD_ALGORITHM, signed_attrs=cms.CMSAttributes.load(signed_attrs_der)
+        )
+        output = io.BytesIO(prepared_pdf)
+        await PdfTBSDocument.async_finish_signing(output, prepared_digest, signature_cms)
+        return output.getvalue()
+
+    return asyncio.run(sign())
+
+def sign_batch(documents, key, executor, reason=None, location=None):
+    """Ajoute la signature numérique à chaque (nom, octets) en préparant les documents en parallèle
+
+    Produit (nom, octets signés, durées, erreur) au fur et à mesure; les durées par fichier sont
+    {'preparation', 'signature', 'latence'} en secondes.
+    """
+    futures = {}
+    for name, pdf_bytes in documents:
+        future = executor.submit(prepare_document, pdf_bytes, *key.worker_args(), reason, location)
+        futures[future] = name
+
+    for future in as_completed(futures):
+        name = futures[future]
+        try:
+            prepared_pdf, prepared_digest, signed_attrs_der, preparation = future.result()
+            start = time.perf_counter()
+            signed = finish_document(prepared_pdf, prepared_digest, signed_attrs_der, key)
+            signature = time.perf_counter() - start
+        except Exception as e:
+            yield name, None, None, str(e)
+            continue
+        durations = {'preparation': preparation, 'signature': signature, 'latence': preparation + signature}
+        yield name, signed, durations, None
+
+def create_test_pkcs12(common_name, passphrase="", days=365):
+    """Crée une clé RSA et un certificat auto-signé au format PKCS#12 (tests uniquement)"""
+    from datetime import datetime, timedelta, timezone
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.hazmat.primitives.serialization import pkcs12
+    from cryptography.x509.oid import NameOID
+
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)])
+    now = datetime.now(timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(private_key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - timedelta(minutes=5))
+        .not_valid_after(now + timedelta(days=days))
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .add_extension(x509.KeyUsage(
+            digital_signature=True, content_commitment=True, key_encipherment=False, data_encipherment=False,
+            key_agreement=False, key_cert_sign=True, crl_sign=False, encipher_only=False, decipher_only=False,
+        ), critical=True)
+        .sign(private_key, hashes.SHA256())
+    )
+    encryption = (serialization.BestAvailableEncryption(passphrase.encode("utf-8")) if passphrase
+                  else serialization.NoEncryption())
+    return pkcs12.serialize_key_and_certificates(common_name.encode("utf-8"), private_key, certificate, None, encryption)
+
+def main():
+    parser = argparse.ArgumentParser(description="Outils de signature numérique PAdES")
+    parser.add_argument("--generer-certificat", metavar="FICHIER", required=True,
+                        help="Crée un certificat auto-signé de test au format PKCS#12")
+    parser.add_argument("--nom", default="Signataire de test", help="Nom (CN) du certificat")
+    parser.add_argument("--mot-de-passe", default="", help="Mot de passe du fichier PKCS#12")
+    args = parser.parse_args()
+
+    with open(args.generer_certificat, 'wb') as f:
+        f.write(create_test_pkcs12(args.nom, args.mot_de_passe))
+    print(f"Certificat de test écrit dans {args.generer_certificat}")
+
+if __name__ == "__main__":
+    main()
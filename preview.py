@@ -0,0 +1,147 @@
+"""Rendu des prévisualisations (miniatures) dans un pool de threads avec cache
+
+PyMuPDF est importé au premier rendu pour ne pas ralentir le démarrage. Le cache est partagé par toutes
+les sessions du serveur: il est borné en octets, pas en nombre d'entrées, car une page rendue en
+prévisualisation pèse beaucoup plus qu'une miniature.
+"""
+import hashlib
+import io
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import signing
+
+THUMBNAIL_DPI = 36
+PREVIEW_ZOOM = 1.5  # Zoom x1.5 pour éviter les images trop lourdes
+MAX_WORKERS = 4
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+# Un rendu plus gros qu'une fraction du cache n'y est pas gardé pour ne pas en chasser tout le reste
+CACHE_MAX_ENTRY_BYTES = CACHE_MAX_BYTES // 8
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="preview")
+_cache = OrderedDict()
+_cache_bytes = 0
+_cache_lock = threading.Lock()
+_local = threading.local()
+
+def pdf_hash(pdf_bytes):
+    """Retourne l'empreinte du contenu d'un PDF (clé de cache)"""
+    return hashlib.sha1(pdf_bytes).hexdigest()
+
+def _cache_get(key):
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    return None
+
+def _entry_size(value):
+    return len(value) if isinstance(value, bytes) else 64
+
+def _cache_put(key, value):
+    global _cache_bytes
+    size = _entry_size(value)
+    if size > CACHE_MAX_ENTRY_BYTES:
+        return
+    with _cache_lock:
+        if key in _cache:
+            _cache_bytes -= _entry_size(_cache.pop(key))
+        _cache[key] = value
+        _cache_bytes += size
+        while _cache_bytes > CACHE_MAX_BYTES:
+            _, evicted = _cache.popitem(last=False)
+            _cache_bytes -= _entry_size(evicted)
+
+def _open_document(file_hash, pdf_bytes):
+    """Ouvre le PDF une seule fois par thread (les documents PyMuPDF ne sont pas partagés entre threads)"""
+    cached = getattr(_local, "document", None)
+    if cached and cached[0] == file_hash:
+        return cached[1]
+    if cached:
+        cached[1].close()
+    import fitz  # PyMuPDF pour la prévisualisation
+    document = fitz.open(stream=pdf_bytes, filetype="pdf")
+    _local.document = (file_hash, document)
+    return document
+
+def get_page_count(pdf_bytes, file_hash):
+    """Retourne le nombre de pages d'un PDF"""
+    key = ("pages", file_hash)
+    count = _cache_get(key)
+    if count is None:
+        import fitz  # PyMuPDF pour la prévisualisation
+        with fitz.open(stream=pdf_bytes, filetype="pdf") as document:
+            count = len(document)
+        _cache_put(key, count)
+    return count
+
+def render_thumbnail(pdf_bytes, file_hash, page_index, dpi=THUMBNAIL_DPI):
+    """Rend une page en PNG basse résolution"""
+    key = ("thumb", file_hash, page_index, dpi)
+    png = _cache_get(key)
+    if png is not None:
+        return png
+
+    import fitz  # PyMuPDF pour la prévisualisation
+
+    zoom = dpi / 72
+    page = _open_document(file_hash, pdf_bytes)[page_index]
+    png = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom)).tobytes("png")
+    _cache_put(key, png)
+    return png
+
+def render_signed_page(pdf_bytes, file_hash, page_index, overlay_bytes, zoom=PREVIEW_ZOOM, stamp=None):
+    """Rend une page avec l'overlay réel apposé, comme dans le PDF final, sans traiter le reste du document"""
+    key = ("signed", file_hash, page_index, zoom, hashlib.sha1(overlay_bytes).hexdigest(),
+           json.dumps(stamp, sort_keys=True, default=str))
+    png = _cache_get(key)
+    if png is not None:
+        return png
+
+    import fitz  # PyMuPDF pour la prévisualisation
+
+    # Document déjà ouvert par le thread: seule la page rendue est copiée, le PDF n'est pas relu
+    document = _open_document(file_hash, pdf_bytes)
+    if stamp is not None:
+        overlay_bytes, _ = signing.create_stamp_overlay(io.BytesIO(overlay_bytes), stamp, [page_index + 1],
+                                                        len(document))
+    with fitz.open() as single, fitz.open(stream=overlay_bytes, filetype="pdf") as overlay:
+        single.insert_pdf(document, from_page=page_index, to_page=page_index)
+        signing.show_overlay(single[0], overlay, 0)
+        png = single[0].get_pixmap(matrix=fitz.Matrix(zoom, zoom)).tobytes("png")
+    _cache_put(key, png)
+    return png
+
+def submit_thumbnails(pdf_bytes, file_hash, page_indexes, dpi=THUMBNAIL_DPI, signed_indexes=(), overlay_bytes=None,
+                      stamp=None):
+    """Soumet le rendu des pages demandées au pool et retourne {future: index de page}
+
+    Les pages de `signed_indexes` sont rendues avec l'overlay réel (signature, texte et tampon) si
+    `overlay_bytes` est donné.
+    """
+    futures = {}
+    for index in page_indexes:
+        if overlay_bytes is not None and index in signed_indexes:
+            future = _executor.submit(render_signed_page, pdf_bytes, file_hash, index, overlay_bytes, dpi / 72, stamp)
+        else:
+            future = _executor.submit(render_thumbnail, pdf_bytes, file_hash, index, dpi)
+        futures[future] = index
+    return futures
+
+def render_first_signed_page(pdf_bytes, file_hash, page_option, custom_pages, overlay_bytes, dpi=THUMBNAIL_DPI,
+                             stamp=None):
+    """Rend en miniature la première page signée d'un document et retourne (numéro de page, PNG)"""
+    pages = signing.get_pages_to_sign(page_option, custom_pages, get_page_count(pdf_bytes, file_hash))
+    if not pages:
+        return None, None
+    return pages[0], render_signed_page(pdf_bytes, file_hash, pages[0] - 1, overlay_bytes, zoom=dpi / 72, stamp=stamp)
+
+def submit_first_signed_pages(documents, page_option, custom_pages, overlay_bytes, dpi=THUMBNAIL_DPI, stamp=None):
+    """Soumet le rendu de chaque (octets, empreinte, nom) au pool et retourne {future: position du document}"""
+    return {
+        _executor.submit(render_first_signed_page, pdf_bytes, file_hash, page_option, custom_pages, overlay_bytes, dpi,
+                         signing.stamp_for_file(stamp, name)): i
+        for i, (pdf_bytes, file_hash, name) in enumerate(documents)
+    }
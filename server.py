@@ -0,0 +1,573 @@
+"""Service HTTP local de signature par lots
+
+Utilisation:
+    python server.py --port 8502 --workers 4
+
+Points d'accès:
+    POST /signer   multipart/form-data avec un ou plusieurs champs `fichiers` (PDF),
+                   `profil` (nom d'un profil sauvegardé) et/ou les paramètres d'un profil
+                   (`nom_signataire`, `x_position`, `y_position`, `signature_width`, `signature_height`,
+                   `text_offset_y`, `text_size`, `page_option`, `custom_pages`, `inclure_date`,
+                   `modele_tampon`, ex: "Paraphe - page {page}/{total}")
+                   ainsi qu'un champ `signature` (image) si le profil n'en a pas.
+                   Un seul PDF est renvoyé tel quel, plusieurs PDFs (ou `format=zip`) dans un ZIP
+                   construit à la volée et envoyé en transfert fragmenté.
+    GET  /metrics  compteurs de requêtes, latences et profondeur de file d'attente (JSON)
+
+Les refus 411, 413, 415 et 429 sont décidés sur les seuls en-têtes. Avec `Expect: 100-continue` (envoyé
+par curl pour les gros corps), le refus remplace le "100 Continue" et le corps n'est jamais transmis;
+sans cet en-tête, le corps est lu et ignoré (jusqu'à DRAIN_MAX_MB) pour que le client reçoive le refus
+au lieu d'une connexion coupée.
+
+Le corps des requêtes est lu par blocs: les PDFs reçus sont écrits dans un répertoire temporaire propre
+à la requête, signés par les workers de fichier à fichier et renvoyés depuis le disque. La mémoire utilisée
+ne dépend donc ni de la taille ni du nombre des PDFs du lot.
+
+Exemple:
+    curl -F profil="Signature officielle" -F fichiers=@a.pdf -F fichiers=@b.pdf \\
+         http://127.0.0.1:8502/signer -o signes.zip
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait
+from datetime import datetime
+from email.message import Message
+from email.parser import BytesParser
+from email.policy import HTTP
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote
+
+import signing
+
+logger = logging.getLogger("server")
+
+class RequestError(Exception):
+    """Erreur renvoyée au client avec un code HTTP"""
+
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers
+
+# Taille des blocs lus sur la connexion et envoyés au client
+CHUNK_SIZE = 64 * 1024
+# Taille maximale des champs texte et des en-têtes d'une partie, gardés en mémoire
+MAX_FIELD_SIZE = 64 * 1024
+# Corps lu et ignoré au plus avant un refus, pour les clients qui n'attendent pas "100 Continue"
+DRAIN_MAX_MB = 64
+# Délai d'inactivité d'une connexion (secondes)
+SOCKET_TIMEOUT = 60
+
+def sign_file(input_path, output_path, overlay_bytes, page_option, custom_pages,
+              streaming_threshold_mb=signing.STREAMING_THRESHOLD_MB, stamp=None):
+    """Signe un PDF reçu sur disque, en streaming au-delà du seuil (exécuté dans un worker)"""
+    return signing.sign_pdf_file(input_path, output_path, io.BytesIO(overlay_bytes), page_option, custom_pages,
+                                 streaming_threshold_mb, stamp)
+
+@lru_cache(maxsize=32)
+def build_overlay(signature_bytes, params):
+    """Crée l'overlay une seule fois par combinaison image / paramètres"""
+    packet = signing.create_signature_overlay(io.BytesIO(signature_bytes), **dict(params))
+    return packet.getvalue()
+
+class BodyReader:
+    """Lecture par blocs d'un corps de `length` octets, jusqu'à des délimiteurs"""
+
+    def __init__(self, stream, length):
+        self.stream = stream
+        self.remaining = length
+        self.buffer = b""
+
+    def fill(self):
+        if self.remaining <= 0:
+            raise RequestError(400, "Corps multipart/form-data incomplet")
+        data = self.stream.read(min(CHUNK_SIZE, self.remaining))
+        if not data:
+            raise RequestError(400, "Connexion interrompue pendant la lecture du corps")
+        self.remaining -= len(data)
+        self.buffer += data
+
+    def read(self, size):
+        while len(self.buffer) < size:
+            self.fill()
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def read_until(self, marker, write, limit=None):
+        """Passe à `write` les octets précédant `marker`, puis consomme le délimiteur"""
+        size = 0
+        while True:
+            index = self.buffer.find(marker)
+            # Les derniers octets sont gardés tant qu'ils peuvent être le début du délimiteur
+            end = index if index >= 0 else max(0, len(self.buffer) - len(marker) + 1)
+            if end:
+                size += end
+                if limit is not None and size > limit:
+                    raise RequestError(413, "Champ de formulaire trop volumineux")
+                write(self.buffer[:end])
+            if index >= 0:
+                self.buffer = self.buffer[index + len(marker):]
+                return
+            self.buffer = self.buffer[end:]
+            self.fill()
+
+def parse_multipart(content_type, stream, length, directory):
+    """Lit un corps multipart/form-data par blocs
+
+    Retourne (champs, fichiers): les champs texte sont gardés en mémoire, chaque fichier est écrit dans
+    `directory` et décrit par (nom du champ, nom du fichier, chemin).
+    """
+    header = Message()
+    header["Content-Type"] = content_type
+    boundary = header.get_param("boundary")
+    if not boundary:
+        raise RequestError(400, "Délimiteur multipart/form-data manquant")
+    delimiter = b"--" + boundary.encode("latin-1")
+    reader = BodyReader(stream, length)
+
+    fields = {}
+    files = []
+    reader.read_until(delimiter, lambda data: None)
+    while reader.read(2) == b"\r\n":
+        headers = io.BytesIO()
+        reader.read_until(b"\r\n\r\n", headers.write, MAX_FIELD_SIZE)
+        part = BytesParser(policy=HTTP).parsebytes(headers.getvalue() + b"\r\n\r\n")
+        name = part.get_param("name", header="content-disposition")
+        filename = part.get_filename()
+        if filename is not None:
+            path = os.path.join(directory, f"partie_{len(files)}")
+            with open(path, 'wb') as f:
+                reader.read_until(b"\r\n" + delimiter, f.write)
+            files.append((name, os.path.basename(filename), path))
+        else:
+            value = io.BytesIO()
+            reader.read_until(b"\r\n" + delimiter, value.write, MAX_FIELD_SIZE)
+            if name:
+                try:
+                    fields[name] = value.getvalue().decode("utf-8")
+                except UnicodeDecodeError:
+                    raise RequestError(400, f"Le champ '{name}' n'est pas encodé en UTF-8")
+    return fields, files
+
+def content_disposition(filename):
+    """En-tête Content-Disposition: nom ASCII de repli et nom complet en UTF-8 (RFC 5987 / 6266)
+
+    send_header encode les en-têtes en latin-1 strict: un nom comme "contrat_œuvre.pdf" ne peut pas y
+    figurer tel quel, et un retour à la ligne dans le nom casserait les en-têtes.
+    """
+    fallback = "".join(c if 32 <= ord(c) < 127 and c not in '"\\' else "_" for c in filename)
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename, safe='')}"
+
+class ChunkedWriter(io.RawIOBase):
+    """Flux en écriture seule envoyé en Transfer-Encoding: chunked"""
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if data:
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii"))
+            self.wfile.write(data)
+            self.wfile.write(b"\r\n")
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        super().close()
+
+class Metrics:
+    """Compteurs exposés sur /metrics"""
+
+    def __init__(self, window=1000):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.requests = 0
+        self.responses = {}
+        self.files_signed = 0
+        self.files_failed = 0
+        self.queued_files = 0
+        self.active_requests = 0
+        self._latencies = deque(maxlen=window)
+
+    def add(self, name, value):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + value)
+
+    def record_response(self, status, latency):
+        with self.lock:
+            self.requests += 1
+            self.responses[str(status)] = self.responses.get(str(status), 0) + 1
+            self._latencies.append(latency)
+
+    def snapshot(self):
+        with self.lock:
+            latencies = sorted(self._latencies)
+            snapshot = {
+                'uptime_s': round(time.monotonic() - self.started),
+                'requests_total': self.requests,
+                'responses': dict(self.responses),
+                'active_requests': self.active_requests,
+                'queue_depth': self.queued_files,
+                'files_signed': self.files_signed,
+                'files_failed': self.files_failed,
+            }
+
+        def percentile(p):
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 1)
+
+        if latencies:
+            snapshot['latency_ms'] = {
+                'count': len(latencies),
+                'mean': round(sum(latencies) / len(latencies) * 1000, 1),
+                'p50': percentile(0.50),
+                'p95': percentile(0.95),
+                'max': round(latencies[-1] * 1000, 1),
+            }
+        return snapshot
+
+class SigningService:
+    """État partagé du serveur: pool de workers, admission et métriques"""
+
+    def __init__(self, workers=2, max_requests=8, max_body_mb=200, streaming_threshold_mb=signing.STREAMING_THRESHOLD_MB):
+        self.workers = workers
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.admission = threading.BoundedSemaphore(max_requests)
+        self.max_body = max_body_mb * 1024 * 1024
+        self.streaming_threshold_mb = streaming_threshold_mb
+        self.metrics = Metrics()
+
+    def resolve_job(self, fields, files):
+        """Détermine l'overlay, les pages à signer et le tampon par page à partir du formulaire"""
+        profile_data = {}
+        signature_bytes = None
+
+        profile_name = fields.get('profil')
+        if profile_name:
+            profiles = signing.read_profiles()
+            if profile_name not in profiles:
+                raise RequestError(404, f"Profil '{profile_name}' introuvable")
+            profile_data = dict(profiles[profile_name])
+            signature_bytes = signing.read_signature_bytes(profile_data.get('signature_image_path'))
+
+        # Les paramètres en ligne remplacent ceux du profil
+        for key, convert in signing.PROFILE_FIELDS.items():
+            if key in fields:
+                try:
+                    profile_data[key] = convert(fields[key])
+                except ValueError:
+                    raise RequestError(400, f"Valeur invalide pour '{key}': {fields[key]}")
+
+        for name, _, path in files:
+            if name == 'signature':
+                with open(path, 'rb') as f:
+                    signature_bytes = f.read()
+        if not signature_bytes:
+            raise RequestError(400, "Aucune image de signature (champ 'signature' ou profil avec image)")
+        if not profile_data.get('nom_signataire'):
+            raise RequestError(400, "Le nom du signataire est obligatoire")
+
+        page_option = profile_data.get('page_option', "Première page uniquement")
+        if page_option not in signing.PAGE_OPTIONS:
+            raise RequestError(400, f"Option de pages inconnue: {page_option}")
+
+        params = signing.overlay_params_from_profile(profile_data, datetime.now().date())
+        try:
+            stamp = signing.stamp_params_from_profile(profile_data, datetime.now().date())
+        except ValueError as e:
+            raise RequestError(400, str(e))
+        try:
+            overlay_bytes = build_overlay(signature_bytes, tuple(sorted(params.items())))
+        except Exception as e:
+            raise RequestError(400, f"Erreur lors de la création de l'overlay: {str(e)}")
+        return overlay_bytes, page_option, profile_data.get('custom_pages', ""), stamp
+
+    def submit(self, input_path, output_path, overlay_bytes, page_option, custom_pages, stamp=None):
+        """Soumet un PDF au pool en tenant à jour la profondeur de file"""
+        self.metrics.add('queued_files', 1)
+        future = self.executor.submit(sign_file, input_path, output_path, overlay_bytes, page_option, custom_pages,
+                                      self.streaming_threshold_mb, stamp)
+        future.add_done_callback(lambda _: self.metrics.add('queued_files', -1))
+        return future
+
+    def sign_stream(self, pdfs, overlay_bytes, page_option, custom_pages, stamp=None):
+        """Signe les PDFs [(nom, chemin)] en gardant au plus `workers` signatures en vol
+
+        Produit (nom, chemin du PDF signé, erreur); le PDF reçu est supprimé une fois signé.
+        """
+        pdfs = deque(pdfs)
+        pending = deque()
+        try:
+            while pdfs or pending:
+                while pdfs and len(pending) < self.workers:
+                    filename, input_path = pdfs.popleft()
+                    output_path = input_path + ".signe.pdf"
+                    future = self.submit(input_path, output_path, overlay_bytes, page_option, custom_pages,
+                                         signing.stamp_for_file(stamp, filename))
+                    pending.append((filename, input_path, output_path, future))
+                filename, input_path, output_path, future = pending.popleft()
+                try:
+                    future.result()
+                except Exception as e:
+                    self.metrics.add('files_failed', 1)
+                    yield filename, None, str(e)
+                else:
+                    self.metrics.add('files_signed', 1)
+                    yield filename, output_path, None
+                finally:
+                    os.remove(input_path)
+        finally:
+            # Réponse interrompue: les signatures en cours sont attendues avant la suppression de leurs fichiers
+            for _, _, _, future in pending:
+                if not future.cancel():
+                    wait([future])
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+class SigningRequestHandler(BaseHTTPRequestHandler):
+    """Gestionnaire HTTP du service de signature"""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "PDFSignature/1.0"
+    timeout = SOCKET_TIMEOUT
+    # Place d'admission détenue par la requête et début de la réponse déjà envoyé
+    admitted = False
+    headers_sent = False
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def log_message(self, format, *args):
+        logger.info("%s - %s", self.address_string(), format % args)
+
+    def send_response(self, code, message=None):
+        # La réponse est commencée dès la ligne de statut: une erreur ne peut plus en envoyer une autre
+        self.headers_sent = True
+        super().send_response(code, message)
+
+    def release_admission(self):
+        """Libère la place d'admission, avant l'envoi de la fin de la réponse
+
+        Un client qui enchaîne ses requêtes envoie la suivante dès la réponse reçue: la place doit être
+        rendue avant, sinon il peut recevoir un 429 alors que sa requête précédente est terminée.
+        """
+        if self.admitted:
+            self.admitted = False
+            self.service.metrics.add('active_requests', -1)
+            self.service.admission.release()
+
+    def send_error_json(self, status, message, headers=None):
+        """Renvoie une erreur au client si la réponse n'a pas commencé (sinon la connexion est fermée)"""
+        self.release_admission()
+        if self.headers_sent:
+            return status
+        try:
+            return self.send_json(status, {'erreur': message}, headers)
+        except OSError:
+            return status
+
+    def check_request(self):
+        """Contrôles faits sur les seuls en-têtes, avant la lecture du corps
+
+        Prend une place d'admission si la requête est acceptée et retourne la taille du corps.
+        """
+        if self.path != "/signer":
+            raise RequestError(404, "Ressource introuvable")
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            raise RequestError(411, "En-tête Content-Length invalide")
+        if length <= 0:
+            raise RequestError(411, "En-tête Content-Length obligatoire")
+        if length > self.service.max_body:
+            raise RequestError(413, "Requête trop volumineuse")
+        if not self.headers.get("Content-Type", "").startswith("multipart/form-data"):
+            raise RequestError(415, "Le corps doit être au format multipart/form-data")
+        if not self.service.admission.acquire(blocking=False):
+            # Serveur saturé: le client doit réessayer plus tard
+            raise RequestError(429, "Serveur saturé, réessayez plus tard", {'Retry-After': "1"})
+        self.admitted = True
+        self.service.metrics.add('active_requests', 1)
+        return length
+
+    def discard_body(self):
+        """Lit et ignore le corps (dans la limite de DRAIN_MAX_MB) pour que le client lise la réponse"""
+        try:
+            remaining = min(int(self.headers.get("Content-Length") or 0), DRAIN_MAX_MB * 1024 * 1024)
+            while remaining > 0:
+                data = self.rfile.read(min(CHUNK_SIZE, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+        except (ValueError, OSError):
+            pass
+
+    def handle_expect_100(self):
+        """Avec Expect: 100-continue, refuse la requête avant que le client n'envoie son corps"""
+        if self.command == "POST":
+            start = time.monotonic()
+            try:
+                self.request_length = self.check_request()
+            except RequestError as e:
+                self.close_connection = True
+                status = self.send_error_json(e.status, str(e), e.headers)
+                self.service.metrics.record_response(status, time.monotonic() - start)
+                return False
+        return super().handle_expect_100()
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False, indent=2).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+        return status
+
+    def do_GET(self):
+        start = time.monotonic()
+        if self.path == "/metrics":
+            status = self.send_json(200, self.service.metrics.snapshot())
+        else:
+            status = self.send_json(404, {'erreur': "Ressource introuvable"})
+        self.service.metrics.record_response(status, time.monotonic() - start)
+
+    def do_POST(self):
+        start = time.monotonic()
+        self.close_connection = True
+        if not self.admitted:
+            # Sans Expect: 100-continue, les contrôles des en-têtes sont faits ici
+            try:
+                self.request_length = self.check_request()
+            except RequestError as e:
+                # Le client envoie tout son corps avant de lire la réponse
+                self.discard_body()
+                status = self.send_error_json(e.status, str(e), e.headers)
+                self.service.metrics.record_response(status, time.monotonic() - start)
+                return
+        try:
+            status = self.handle_sign()
+        except RequestError as e:
+            status = self.send_error_json(e.status, str(e))
+        except Exception:
+            logger.exception("Erreur inattendue pendant le traitement de %s", self.path)
+            status = self.send_error_json(500, "Erreur interne du serveur")
+        finally:
+            self.release_admission()
+        self.service.metrics.record_response(status, time.monotonic() - start)
+
+    def handle_sign(self):
+        """Traite une requête de signature acceptée par check_request et renvoie le PDF ou le ZIP"""
+        content_type = self.headers.get("Content-Type", "")
+        with tempfile.TemporaryDirectory(prefix="signer_") as tmp_dir:
+            fields, files = parse_multipart(content_type, self.rfile, self.request_length, tmp_dir)
+            pdfs = [(filename, path) for name, filename, path in files if name == 'fichiers']
+            if not pdfs:
+                raise RequestError(400, "Aucun fichier PDF (champ 'fichiers')")
+            overlay_bytes, page_option, custom_pages, stamp = self.service.resolve_job(fields, files)
+            results = self.service.sign_stream(pdfs, overlay_bytes, page_option, custom_pages, stamp)
+            try:
+                if len(pdfs) == 1 and fields.get('format') != 'zip':
+                    return self.send_pdf(results)
+                return self.send_zip(results)
+            finally:
+                results.close()
+
+    def send_pdf(self, results):
+        """Renvoie l'unique PDF signé depuis le disque"""
+        filename, path, error = next(results)
+        if error:
+            raise RequestError(422, f"Erreur lors du traitement de {filename}: {error}")
+        disposition = content_disposition(f"signed_{filename}")
+        length = os.path.getsize(path)
+        self.release_admission()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/pdf")
+        self.send_header("Content-Disposition", disposition)
+        self.send_header("Content-Length", str(length))
+        self.end_headers()
+        with open(path, 'rb') as f:
+            shutil.copyfileobj(f, self.wfile, CHUNK_SIZE)
+        return 200
+
+    def send_zip(self, results):
+        """Renvoie les PDFs signés dans un ZIP envoyé au fur et à mesure des signatures"""
+        # ZIP construit à la volée: chaque PDF est envoyé dès qu'il est signé
+        self.send_response(200)
+        self.send_header("Content-Type", "application/zip")
+        self.send_header("Content-Disposition",
+                         content_disposition(f"pdfs_signes_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"))
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        errors = []
+        stream = ChunkedWriter(self.wfile)
+        with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+            for filename, path, error in results:
+                if error:
+                    errors.append(f"{filename}: {error}")
+                    continue
+                zip_file.write(path, f"signed_{filename}")
+                os.remove(path)
+                self.wfile.flush()
+            # Signatures terminées: seule la fin du ZIP reste à envoyer
+            self.release_admission()
+            if errors:
+                zip_file.writestr("erreurs.txt", "\n".join(errors))
+        stream.close()
+        return 200
+
+def create_server(host="127.0.0.1", port=8502, workers=2, max_requests=8, max_body_mb=200,
+                  streaming_threshold_mb=signing.STREAMING_THRESHOLD_MB):
+    """Crée le serveur HTTP et son service de signature"""
+    server = ThreadingHTTPServer((host, port), SigningRequestHandler)
+    server.daemon_threads = True
+    server.service = SigningService(workers=workers, max_requests=max_requests, max_body_mb=max_body_mb,
+                                    streaming_threshold_mb=streaming_threshold_mb)
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Service HTTP local de signature PDF")
+    parser.add_argument("--hote", default="127.0.0.1", help="Adresse d'écoute")
+    parser.add_argument("--port", type=int, default=8502, help="Port d'écoute")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Nombre de signatures simultanées")
+    parser.add_argument("--requetes-max", type=int, default=8,
+                        help="Requêtes acceptées simultanément avant de répondre 429")
+    parser.add_argument("--taille-max", type=int, default=200, help="Taille maximale d'une requête (Mo)")
+    parser.add_argument("--seuil-streaming", type=float, default=signing.STREAMING_THRESHOLD_MB,
+                        help="Taille (Mo) au-delà de laquelle un PDF est signé par blocs de pages, à mémoire constante")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    server = create_server(args.hote, args.port, args.workers, args.requetes_max, args.taille_max,
+                           args.seuil_streaming)
+    logger.info("Service de signature sur http://%s:%d", args.hote, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.service.shutdown()
+
+if __name__ == "__main__":
+    main()
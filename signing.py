@@ -0,0 +1,410 @@
+"""Fonctions de signature PDF partagées par l'application Streamlit et les modes sans interface
+
+PyPDF2, ReportLab et PyMuPDF sont importés au premier traitement pour ne pas ralentir le démarrage.
+"""
+import io
+import json
+import os
+import shutil
+import string
+import tempfile
+from datetime import datetime
+
+PAGE_OPTIONS = ["Première page uniquement", "Dernière page uniquement", "Toutes les pages", "Pages personnalisées"]
+
+def parse_bool(value):
+    """Interprète une valeur textuelle de formulaire ou de manifeste comme un booléen"""
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "oui", "vrai", "on")
+
+# Champs de profil acceptés hors de l'application (formulaire HTTP, manifeste) et conversion de leur valeur
+PROFILE_FIELDS = {
+    'nom_signataire': str,
+    'x_position': float,
+    'y_position': float,
+    'signature_width': float,
+    'signature_height': float,
+    'text_offset_y': float,
+    'text_size': float,
+    'page_option': str,
+    'custom_pages': str,
+    'inclure_date': parse_bool,
+    'modele_tampon': str,
+}
+
+# Champs du tampon par page, en plus des champs du profil (ex: "Paraphe - page {page}/{total}")
+STAMP_FIELDS = ('page', 'total', 'fichier', 'nom', 'date', 'heure')
+
+# Au-delà de ce seuil, les PDFs sont signés sur disque par blocs de pages (mémoire constante)
+STREAMING_THRESHOLD_MB = 50
+STREAMING_CHUNK_PAGES = 500
+# Emprise de la page overlay créée par ReportLab (format letter, coordonnées PDF)
+OVERLAY_RECT = (0, 0, 612, 792)
+
+# Fonctions pour la gestion des profils
+def get_profiles_file_path():
+    """Retourne le chemin du fichier de profils"""
+    # Utiliser le répertoire utilisateur pour la persistance
+    home_dir = os.path.expanduser("~")
+    app_dir = os.path.join(home_dir, ".streamlit_pdf_signature")
+    os.makedirs(app_dir, exist_ok=True)
+    return os.path.join(app_dir, "signature_profiles.json")
+
+def read_profiles():
+    """Lit les profils depuis le fichier JSON (lève une exception en cas d'erreur)"""
+    profiles_file = get_profiles_file_path()
+    if os.path.exists(profiles_file):
+        with open(profiles_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+def read_signature_bytes(image_path):
+    """Lit l'image de signature d'un profil et retourne ses octets"""
+    if image_path and os.path.exists(image_path):
+        with open(image_path, 'rb') as f:
+            return f.read()
+    return None
+
+def overlay_params_from_profile(profile_data, date_sig):
+    """Retourne les paramètres de create_signature_overlay définis par un profil"""
+    return {
+        'nom': profile_data.get('nom_signataire', ""),
+        'date_sig': date_sig if profile_data.get('inclure_date', True) else None,
+        'x': profile_data.get('x_position', 400),
+        'y': profile_data.get('y_position', 100),
+        'width': profile_data.get('signature_width', 120),
+        'height': profile_data.get('signature_height', 60),
+        'text_offset': profile_data.get('text_offset_y', -20),
+        'font_size': profile_data.get('text_size', 8),
+    }
+
+def stamp_template_fields(template):
+    """Retourne les champs utilisés par un modèle de tampon (ValueError si un champ est inconnu)"""
+    try:
+        fields = [name for _, name, _, _ in string.Formatter().parse(template) if name is not None]
+    except ValueError:
+        raise ValueError("Modèle de tampon mal formé (accolade non fermée)")
+    for name in fields:
+        if name not in STAMP_FIELDS and name not in PROFILE_FIELDS:
+            raise ValueError(f"Champ inconnu dans le modèle de tampon: {{{name}}}")
+    return fields
+
+def stamp_params_from_profile(profile_data, date_sig, now=None):
+    """Retourne le tampon par page défini par un profil, ou None si le profil n'a pas de modèle
+
+    Le texte est placé sous le nom et la date de l'overlay statique. Les champs du profil, la date et l'heure
+    sont fixés pour tout le lot; {page}, {total} et {fichier} sont complétés pour chaque document.
+    """
+    template = (profile_data.get('modele_tampon') or "").strip()
+    if not template:
+        return None
+    stamp_template_fields(template)
+
+    params = overlay_params_from_profile(profile_data, date_sig)
+    now = now or datetime.now()
+    fields = {key: profile_data.get(key, "") for key in PROFILE_FIELDS}
+    fields.update(
+        fichier="",
+        nom=params['nom'],
+        date=(date_sig or now).strftime("%d/%m/%Y"),
+        heure=now.strftime("%H:%M"),
+    )
+    return {
+        'modele': template,
+        'x': params['x'],
+        'y': params['y'] + params['text_offset'] - (24 if params['date_sig'] else 12),
+        'font_size': max(6, params['font_size'] - 1),
+        'champs': fields,
+    }
+
+def stamp_for_file(stamp, filename):
+    """Complète le tampon par page avec le nom du document traité"""
+    if stamp is None:
+        return None
+    return dict(stamp, champs=dict(stamp['champs'], fichier=filename))
+
+def stamp_texts(stamp, pages_to_sign, total_pages):
+    """Retourne (textes distincts, {numéro de page: index du texte}) pour les pages signées d'un document"""
+    texts = []
+    indexes = {}
+    variants = {}
+    for page_num in pages_to_sign:
+        try:
+            text = stamp['modele'].format_map(dict(stamp['champs'], page=page_num, total=total_pages))
+        except (KeyError, ValueError, IndexError) as e:
+            raise ValueError(f"Modèle de tampon invalide: {e}")
+        if text not in indexes:
+            indexes[text] = len(texts)
+            texts.append(text)
+        variants[page_num] = indexes[text]
+    return texts, variants
+
+# Fonctions pour le traitement des pages
+def parse_page_numbers(page_string, total_pages):
+    """Parse une chaîne de pages personnalisées et retourne une liste de numéros de page"""
+    if not page_string:
+        return []
+
+    pages = set()
+    parts = page_string.replace(" ", "").split(",")
+
+    for part in parts:
+        if "-" in part:
+            # Plage de pages (ex: 1-3)
+            try:
+                start, end = part.split("-")
+                start = max(1, int(start))
+                end = min(total_pages, int(end))
+                pages.update(range(start, end + 1))
+            except ValueError:
+                continue
+        else:
+            # Page unique
+            try:
+                page_num = int(part)
+                if 1 <= page_num <= total_pages:
+                    pages.add(page_num)
+            except ValueError:
+                continue
+
+    return sorted(list(pages))
+
+def get_pages_to_sign(page_option, custom_pages, total_pages):
+    """Détermine quelles pages doivent être signées selon l'option choisie"""
+    if page_option == "Première page uniquement":
+        return [1] if total_pages > 0 else []
+    elif page_option == "Dernière page uniquement":
+        return [total_pages] if total_pages > 0 else []
+    elif page_option == "Toutes les pages":
+        return list(range(1, total_pages + 1))
+    elif page_option == "Pages personnalisées":
+        return parse_page_numbers(custom_pages, total_pages)
+    else:
+        return [1]  # Par défaut, première page
+
+def create_signature_overlay(signature_img, nom, date_sig, x, y, width, height, text_offset, font_size):
+    """Crée un PDF overlay avec la signature et les informations"""
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.utils import ImageReader
+
+    packet = io.BytesIO()
+    c = canvas.Canvas(packet, pagesize=letter)
+
+    # Ajout de l'image de signature
+    if signature_img:
+        # Réinitialiser le pointeur de l'image
+        signature_img.seek(0)
+        # Créer un objet ImageReader pour ReportLab
+        img_reader = ImageReader(signature_img)
+        c.drawImage(img_reader, x, y, width=width, height=height, mask='auto')
+
+    # Ajout du nom avec "Signé par"
+    if nom:
+        c.setFont("Helvetica", font_size)
+        signature_text = f"Signé par: {nom}"
+        c.drawString(x, y + text_offset, signature_text)
+
+    # Ajout de la date au format DD/MM/YYYY
+    if date_sig:
+        c.setFont("Helvetica", max(6, font_size - 1))  # Taille légèrement plus petite pour la date
+        date_formatted = date_sig.strftime("%d/%m/%Y")
+        c.drawString(x, y + text_offset - 12, f"Date: {date_formatted}")
+
+    c.save()
+    packet.seek(0)
+    return packet
+
+def create_stamp_variants(texts, x, y, font_size):
+    """Crée en un seul rendu un PDF overlay contenant une page par texte variable"""
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import letter
+
+    packet = io.BytesIO()
+    c = canvas.Canvas(packet, pagesize=letter)
+    for text in texts:
+        c.setFont("Helvetica", font_size)
+        c.drawString(x, y, text)
+        c.showPage()
+    c.save()
+    packet.seek(0)
+    return packet
+
+def build_stamp_pages(signature_page, stamp, pages_to_sign, total_pages):
+    """Retourne (pages overlay distinctes, {numéro de page: index de l'overlay}) pour les pages signées
+
+    Avec un tampon, l'overlay statique (image et texte) devient un seul formulaire XObject référencé par
+    toutes les pages de variantes: chaque page du document ne subit qu'une fusion, comme sans tampon.
+    """
+    from PyPDF2 import PdfReader
+    from PyPDF2.generic import ArrayObject, DecodedStreamObject, DictionaryObject, FloatObject, NameObject
+
+    if stamp is None:
+        return [signature_page], dict.fromkeys(pages_to_sign, 0)
+
+    static_form = DecodedStreamObject()
+    static_form.set_data(signature_page.get_contents().get_data())
+    static_form.update({
+        NameObject("/Type"): NameObject("/XObject"),
+        NameObject("/Subtype"): NameObject("/Form"),
+        NameObject("/BBox"): ArrayObject(FloatObject(value) for value in OVERLAY_RECT),
+        NameObject("/Resources"): signature_page["/Resources"],
+    })
+
+    texts, variants = stamp_texts(stamp, pages_to_sign, total_pages)
+    variants_reader = PdfReader(create_stamp_variants(texts, stamp['x'], stamp['y'], stamp['font_size']))
+    # Objet indirect du lecteur des variantes: le formulaire n'est écrit qu'une fois dans le PDF signé
+    variants_reader.cache_indirect_object(0, variants_reader.trailer["/Size"], static_form)
+    combined = []
+    for variant_page in variants_reader.pages:
+        variant_page["/Resources"].get_object()[NameObject("/XObject")] = DictionaryObject({
+            NameObject("/Statique"): static_form.indirect_reference
+        })
+        contents = DecodedStreamObject()
+        contents.set_data(b"q /Statique Do Q\n" + variant_page.get_contents().get_data())
+        variant_page[NameObject("/Contents")] = contents
+        combined.append(variant_page)
+    return combined, variants
+
+def create_stamp_overlay(signature_overlay_packet, stamp, pages_to_sign, total_pages):
+    """Écrit l'overlay de plusieurs pages (une par texte distinct) et retourne (octets, {numéro de page: index})"""
+    from PyPDF2 import PdfReader, PdfWriter
+
+    signature_overlay_packet.seek(0)
+    stamp_pages, variants = build_stamp_pages(PdfReader(signature_overlay_packet).pages[0], stamp, pages_to_sign,
+                                              total_pages)
+    writer = PdfWriter()
+    for page in stamp_pages:
+        writer.add_page(page)
+    output_buffer = io.BytesIO()
+    writer.write(output_buffer)
+    return output_buffer.getvalue(), variants
+
+def process_pdf(pdf_bytes, signature_overlay_packet, page_option, custom_pages="", stamp=None):
+    """Ajoute la signature sur les pages spécifiées d'un PDF et retourne les octets signés"""
+    from PyPDF2 import PdfReader, PdfWriter
+
+    # Lecture du PDF original
+    pdf_reader = PdfReader(io.BytesIO(pdf_bytes))
+    pdf_writer = PdfWriter()
+
+    # Nombre total de pages
+    total_pages = len(pdf_reader.pages)
+
+    # Déterminer les pages à signer
+    pages_to_sign = get_pages_to_sign(page_option, custom_pages, total_pages)
+
+    # Lecture de l'overlay de signature, complété par le tampon de chaque page s'il y en a un
+    signature_overlay_packet.seek(0)
+    overlay_pdf = PdfReader(signature_overlay_packet)
+    stamp_pages, variants = build_stamp_pages(overlay_pdf.pages[0], stamp, pages_to_sign, total_pages)
+
+    # Traitement de chaque page
+    for page_num in range(total_pages):
+        page = pdf_reader.pages[page_num]
+
+        # Ajout de la signature sur les pages sélectionnées (conversion 0-indexé)
+        if (page_num + 1) in variants:
+            page.merge_page(stamp_pages[variants[page_num + 1]])
+
+        pdf_writer.add_page(page)
+
+    # Création du PDF résultant
+    output_buffer = io.BytesIO()
+    pdf_writer.write(output_buffer)
+
+    return output_buffer.getvalue()
+
+def show_overlay(page, overlay, overlay_index):
+    """Appose la page `overlay_index` du document PyMuPDF `overlay` sur `page`"""
+    import fitz  # PyMuPDF pour le traitement en streaming
+
+    # Même placement que PdfPage.merge_page: l'overlay est posé dans l'espace utilisateur de la page
+    rect = fitz.Rect(OVERLAY_RECT) * page.transformation_matrix
+    page.show_pdf_page(rect, overlay, overlay_index, keep_proportion=False)
+
+def process_pdf_file(input_path, output_path, signature_overlay_packet, page_option, custom_pages="",
+                     chunk_pages=STREAMING_CHUNK_PAGES, stamp=None):
+    """Signe un PDF sur disque par blocs de pages et écrit le résultat dans output_path
+
+    Le fichier d'origine est copié puis complété par des mises à jour incrémentales: seules les pages
+    du bloc en cours sont chargées, la mémoire utilisée ne dépend pas du nombre de pages. Avec un tampon
+    par page, toutes les variantes sont rendues en un seul overlay de plusieurs pages.
+    """
+    import fitz  # PyMuPDF pour le traitement en streaming
+
+    shutil.copyfile(input_path, output_path)
+
+    try:
+        document = fitz.open(output_path, filetype="pdf")
+    except fitz.FileDataError:
+        raise ValueError("PDF illisible ou endommagé")
+
+    overlay = None
+    try:
+        if document.needs_pass:
+            raise ValueError("PDF protégé par mot de passe")
+        if not document.can_save_incrementally():
+            # PDF réparé à l'ouverture: une réécriture complète est nécessaire avant les mises à jour
+            repaired_path = output_path + ".repare"
+            document.save(repaired_path)
+            document.close()
+            os.replace(repaired_path, output_path)
+            document = fitz.open(output_path, filetype="pdf")
+
+        pages_to_sign = get_pages_to_sign(page_option, custom_pages, document.page_count)
+        if stamp is None:
+            signature_overlay_packet.seek(0)
+            overlay_bytes, variants = signature_overlay_packet.read(), dict.fromkeys(pages_to_sign, 0)
+        else:
+            overlay_bytes, variants = create_stamp_overlay(signature_overlay_packet, stamp, pages_to_sign,
+                                                           document.page_count)
+        # Image et formulaire partagés par les variantes: recopiés une fois par bloc (table de greffe par ouverture)
+        overlay = fitz.open(stream=overlay_bytes, filetype="pdf")
+
+        shown_pages = {}
+        for start in range(0, len(pages_to_sign), chunk_pages):
+            if start:
+                # Réouverture pour libérer les objets du bloc précédent, en réutilisant les overlays déjà écrits
+                document = fitz.open(output_path, filetype="pdf")
+                document.ShownPages.update(shown_pages)
+
+            for page_num in pages_to_sign[start:start + chunk_pages]:
+                show_overlay(document[page_num - 1], overlay, variants[page_num])
+
+            shown_pages = dict(document.ShownPages)
+            document.saveIncr()
+            document.close()
+    finally:
+        if not document.is_closed:
+            document.close()
+        if overlay is not None:
+            overlay.close()
+
+def sign_pdf_file(input_path, output_path, signature_overlay_packet, page_option, custom_pages="",
+                  streaming_threshold_mb=STREAMING_THRESHOLD_MB, stamp=None):
+    """Signe un PDF sur disque, en streaming au-delà de `streaming_threshold_mb` Mo, et retourne la taille du résultat"""
+    if os.path.getsize(input_path) > streaming_threshold_mb * 1024 * 1024:
+        process_pdf_file(input_path, output_path, signature_overlay_packet, page_option, custom_pages, stamp=stamp)
+    else:
+        with open(input_path, 'rb') as f:
+            signed = process_pdf(f.read(), signature_overlay_packet, page_option, custom_pages, stamp)
+        with open(output_path, 'wb') as f:
+            f.write(signed)
+    return os.path.getsize(output_path)
+
+def sign_pdf_bytes(pdf_bytes, signature_overlay_packet, page_option, custom_pages="",
+                   streaming_threshold_mb=STREAMING_THRESHOLD_MB, stamp=None):
+    """Signe un PDF en mémoire, en passant par des fichiers temporaires au-delà de `streaming_threshold_mb` Mo"""
+    if len(pdf_bytes) <= streaming_threshold_mb * 1024 * 1024:
+        return process_pdf(pdf_bytes, signature_overlay_packet, page_option, custom_pages, stamp)
+
+    with tempfile.TemporaryDirectory(prefix="signature_") as tmp_dir:
+        input_path = os.path.join(tmp_dir, "original.pdf")
+        output_path = os.path.join(tmp_dir, "signe.pdf")
+        with open(input_path, 'wb') as f:
+            f.write(pdf_bytes)
+        process_pdf_file(input_path, output_path, signature_overlay_packet, page_option, custom_pages, stamp=stamp)
+        with open(output_path, 'rb') as f:
+            return f.read()
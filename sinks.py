@@ -0,0 +1,155 @@
+"""Destinations des PDFs signés, en plus du téléchargement: dossier local ou stockage objet compatible S3
+
+Chaque fichier est envoyé dès qu'il est signé: submit() rend la main immédiatement tant que moins de
+`max_concurrency` envois sont en cours, et attend sinon. Au plus `max_concurrency` fichiers sont donc
+gardés pour l'envoi, jamais le lot complet.
+
+boto3 est une dépendance facultative (pip install boto3), importée seulement pour le stockage S3.
+Test avec un stockage compatible S3 local:
+    docker run -p 9000:9000 minio/minio server /data
+    (point d'accès http://127.0.0.1:9000, clés minioadmin / minioadmin)
+"""
+import abc
+import importlib.util
+import io
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_CONCURRENCY = 4
+# Au-delà de cette taille, les fichiers sont envoyés en plusieurs parties (minimum S3: 5 Mo)
+PART_SIZE_MB = 8
+
+def is_s3_available():
+    """Indique si boto3 est installé"""
+    return importlib.util.find_spec("boto3") is not None
+
+class OutputSink(abc.ABC):
+    """Envoi en arrière-plan des fichiers signés vers une destination, avec un nombre d'envois borné"""
+
+    def __init__(self, max_concurrency=MAX_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="sink")
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._futures = []
+
+    @abc.abstractmethod
+    def write(self, name, data):
+        """Écrit un fichier et retourne son emplacement (propre à chaque destination)"""
+
+    def submit(self, name, data):
+        """Envoie un fichier en arrière-plan; attend tant que `max_concurrency` envois sont en cours"""
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(self._send, name, data)
+        except Exception:
+            self._slots.release()
+            raise
+        self._futures.append((name, future))
+        return future
+
+    def _send(self, name, data):
+        start = time.perf_counter()
+        try:
+            location = self.write(name, data)
+        finally:
+            self._slots.release()
+        return location, time.perf_counter() - start
+
+    def close(self):
+        """Attend la fin des envois et retourne [(nom, emplacement, durée en secondes, erreur)]
+
+        Peut être appelée plusieurs fois: les appels suivants retournent une liste vide.
+        """
+        results = []
+        for name, future in self._futures:
+            try:
+                location, duration = future.result()
+                results.append((name, location, duration, None))
+            except Exception as e:
+                results.append((name, None, None, str(e)))
+        self._executor.shutdown(wait=True)
+        self._futures = []
+        return results
+
+class LocalDirectorySink(OutputSink):
+    """Écrit les fichiers signés dans un dossier local ou partagé"""
+
+    def __init__(self, directory, max_concurrency=MAX_CONCURRENCY):
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError as e:
+            raise ValueError(f"Dossier de sortie inaccessible: {e}")
+        super().__init__(max_concurrency)
+        self.directory = directory
+        self.label = directory
+
+    def write(self, name, data):
+        path = os.path.join(self.directory, os.path.basename(name))
+        # Écriture atomique pour ne jamais exposer un fichier partiel dans le dossier; le fichier temporaire
+        # est unique, deux envois du même nom ne peuvent pas écrire dans le même
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".", suffix=".part")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            # mkstemp crée le fichier en 0600: droits habituels d'un fichier de sortie
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return path
+
+class S3Sink(OutputSink):
+    """Envoie les fichiers signés vers un bucket compatible S3 (AWS, MinIO...)
+
+    Un seul client boto3 est partagé par les envois, avec un pool de `max_concurrency` connexions. Les
+    fichiers plus gros que `part_size_mb` sont envoyés en multipart, partie par partie sur la connexion
+    de leur envoi. Sans clés explicites, les identifiants habituels de boto3 sont utilisés
+    (variables d'environnement, ~/.aws).
+    """
+
+    def __init__(self, bucket, prefix="", endpoint_url=None, access_key=None, secret_key=None, region=None,
+                 max_concurrency=MAX_CONCURRENCY, part_size_mb=PART_SIZE_MB):
+        import boto3
+        from boto3.s3.transfer import TransferConfig
+        from botocore.config import Config
+        from botocore.exceptions import BotoCoreError, ClientError
+
+        if not bucket:
+            raise ValueError("Nom du bucket manquant")
+        self.client = boto3.session.Session().client(
+            "s3",
+            endpoint_url=endpoint_url or None,
+            aws_access_key_id=access_key or None,
+            aws_secret_access_key=secret_key or None,
+            region_name=region or None,
+            config=Config(max_pool_connections=max_concurrency, retries={'max_attempts': 3}),
+        )
+        # Vérification avant le traitement pour ne pas signer tout un lot sans pouvoir l'envoyer
+        try:
+            self.client.head_bucket(Bucket=bucket)
+        except (BotoCoreError, ClientError) as e:
+            raise ValueError(f"Bucket '{bucket}' inaccessible: {e}")
+
+        super().__init__(max_concurrency)
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.label = f"s3://{bucket}/{self.prefix}" if self.prefix else f"s3://{bucket}"
+        part_size = int(part_size_mb * 1024 * 1024)
+        self.transfer_config = TransferConfig(multipart_threshold=part_size, multipart_chunksize=part_size,
+                                              use_threads=False)
+
+    def write(self, name, data):
+        key = f"{self.prefix}/{os.path.basename(name)}" if self.prefix else os.path.basename(name)
+        self.client.upload_fileobj(io.BytesIO(data), self.bucket, key, ExtraArgs={'ContentType': "application/pdf"},
+                                   Config=self.transfer_config)
+        return f"s3://{self.bucket}/{key}"
+
+    def close(self):
+        results = super().close()
+        self.client.close()
+        return results
@@ -0,0 +1,34 @@
+import io
+import os
+import sys
+
+import pytest
+
+# Les modules de l'application sont à la racine du dépôt
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def make_pdf():
+    """Crée un PDF de test dont chaque page contient "Contenu page N" """
+    def make(page_count):
+        from reportlab.pdfgen import canvas
+
+        buffer = io.BytesIO()
+        c = canvas.Canvas(buffer)
+        for page in range(page_count):
+            c.drawString(72, 720, f"Contenu page {page + 1}")
+            c.showPage()
+        c.save()
+        return buffer.getvalue()
+    return make
+
+
+@pytest.fixture
+def signature_png():
+    """Image de signature de test (PNG)"""
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGBA", (120, 60), (20, 40, 160, 200)).save(buffer, "PNG")
+    return buffer.getvalue()
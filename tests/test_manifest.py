@@ -0,0 +1,136 @@
+"""Lecture des manifestes multi-signataires et regroupement des fichiers par overlay"""
+import json
+from datetime import date
+
+import pytest
+
+import manifest
+
+DATE_SIG = date(2025, 1, 15)
+BASE_SETTINGS = {'nom_signataire': "Jean Dupont", 'page_option': "Première page uniquement"}
+
+
+@pytest.mark.parametrize("delimiter", [",", ";", "\t"])
+def test_parse_csv_delimiters(delimiter):
+    text = delimiter.join(["fichier", "profil", "nom_signataire", "x_position"]) + "\n"
+    text += delimiter.join(["a.pdf", "Direction", "", ""]) + "\n"
+    text += delimiter.join(["b.pdf", "", "Marie Curie", "350"]) + "\n"
+
+    entries = manifest.parse_manifest(text.encode("utf-8"), "lot.csv")
+
+    assert entries == [
+        {'fichier': "a.pdf", 'profil': "Direction", 'parametres': {}},
+        {'fichier': "b.pdf", 'profil': None, 'parametres': {'nom_signataire': "Marie Curie", 'x_position': 350.0}},
+    ]
+
+
+def test_parse_csv_with_bom():
+    entries = manifest.parse_manifest("\ufefffichier;nom_signataire\na.pdf;Jean\n".encode("utf-8"), "lot.csv")
+    assert entries == [{'fichier': "a.pdf", 'profil': None, 'parametres': {'nom_signataire': "Jean"}}]
+
+
+def test_parse_json_list():
+    data = json.dumps([
+        {'fichier': "a.pdf", 'profil': "Direction"},
+        {'fichier': "b.pdf", 'inclure_date': "non", 'page_option': "Toutes les pages"},
+    ]).encode("utf-8")
+
+    entries = manifest.parse_manifest(data, "lot.json")
+
+    assert entries == [
+        {'fichier': "a.pdf", 'profil': "Direction", 'parametres': {}},
+        {'fichier': "b.pdf", 'profil': None, 'parametres': {'inclure_date': False, 'page_option': "Toutes les pages"}},
+    ]
+
+
+def test_parse_json_dict():
+    data = json.dumps({'a.pdf': "Direction", 'b.pdf': {'nom_signataire': "Marie Curie"}}).encode("utf-8")
+
+    entries = manifest.parse_manifest(data, "lot.json")
+
+    assert entries == [
+        {'fichier': "a.pdf", 'profil': "Direction", 'parametres': {}},
+        {'fichier': "b.pdf", 'profil': None, 'parametres': {'nom_signataire': "Marie Curie"}},
+    ]
+
+
+@pytest.mark.parametrize("text, message", [
+    ("fichier;couleur\na.pdf;rouge\n", "colonne(s) inconnue(s): couleur"),
+    ("fichier;profil\na.pdf;A\na.pdf;B\n", "apparaît plusieurs fois"),
+    ("fichier;x_position\na.pdf;gauche\n", "valeur invalide pour 'x_position'"),
+    ("fichier;page_option\na.pdf;Une page sur deux\n", "option de pages inconnue"),
+    ("fichier;profil\n;A\n", "nom de fichier manquant"),
+])
+def test_parse_rejects_invalid_rows(text, message):
+    with pytest.raises(ValueError, match=message.replace("(", r"\(").replace(")", r"\)")):
+        manifest.parse_manifest(text.encode("utf-8"), "lot.csv")
+
+
+def test_parse_rejects_invalid_json():
+    with pytest.raises(ValueError, match="JSON invalide"):
+        manifest.parse_manifest(b"[{", "lot.json")
+    with pytest.raises(ValueError, match="entrée invalide"):
+        manifest.parse_manifest(b'["a.pdf"]', "lot.json")
+
+
+def make_profiles(tmp_path):
+    image_path = tmp_path / "direction.png"
+    image_path.write_bytes(b"image direction")
+    return {
+        'Direction': {'nom_signataire': "La Direction", 'x_position': 300, 'page_option': "Toutes les pages",
+                      'signature_image_path': str(image_path)},
+        'Sans image': {'nom_signataire': "Sans Image"},
+    }
+
+
+def test_build_jobs_merges_profile_parameters_and_base_settings(tmp_path):
+    entries = manifest.parse_manifest(
+        "fichier;profil;x_position\na.pdf;Direction;\nb.pdf;Direction;350\nabsent.pdf;;\n".encode("utf-8"), "lot.csv")
+
+    jobs, missing = manifest.build_jobs(entries, ["a.pdf", "b.pdf", "c.pdf"], make_profiles(tmp_path), BASE_SETTINGS,
+                                        b"image de base", DATE_SIG)
+
+    assert missing == ["absent.pdf"]
+    assert jobs['a.pdf']['signature'] == b"image direction"
+    assert jobs['a.pdf']['params']['nom'] == "La Direction"
+    assert jobs['a.pdf']['params']['x'] == 300
+    assert jobs['a.pdf']['page_option'] == "Toutes les pages"
+    assert jobs['a.pdf']['source'] == "Direction"
+    assert jobs['b.pdf']['params']['x'] == 350.0
+    # Fichier hors manifeste: réglages de base
+    assert jobs['c.pdf']['signature'] == b"image de base"
+    assert jobs['c.pdf']['params']['nom'] == "Jean Dupont"
+    assert jobs['c.pdf']['source'] == "Réglages actuels"
+
+
+def test_build_jobs_falls_back_to_base_signature_and_rejects_unknown_profile(tmp_path):
+    profiles = make_profiles(tmp_path)
+    entries = manifest.parse_manifest(b"fichier;profil\na.pdf;Sans image\n", "lot.csv")
+    jobs, _ = manifest.build_jobs(entries, ["a.pdf"], profiles, BASE_SETTINGS, b"image de base", DATE_SIG)
+    assert jobs['a.pdf']['signature'] == b"image de base"
+
+    entries = manifest.parse_manifest(b"fichier;profil\na.pdf;Inconnu\n", "lot.csv")
+    with pytest.raises(ValueError, match="profil 'Inconnu' introuvable"):
+        manifest.build_jobs(entries, ["a.pdf"], profiles, BASE_SETTINGS, b"image de base", DATE_SIG)
+
+    with pytest.raises(ValueError, match="aucune image de signature"):
+        manifest.build_jobs([], ["a.pdf"], profiles, BASE_SETTINGS, None, DATE_SIG)
+
+
+def test_group_jobs_groups_identical_overlays(tmp_path):
+    entries = manifest.parse_manifest(
+        "fichier;profil;x_position;modele_tampon\n"
+        "a.pdf;Direction;;\n"
+        "b.pdf;Direction;;\n"
+        "c.pdf;Direction;350;\n"
+        "d.pdf;Direction;;page {page}\n"
+        "e.pdf;Direction;;page {page}\n".encode("utf-8"), "lot.csv")
+    jobs, _ = manifest.build_jobs(entries, ["a.pdf", "b.pdf", "c.pdf", "d.pdf", "e.pdf", "f.pdf"],
+                                  make_profiles(tmp_path), BASE_SETTINGS, b"image de base", DATE_SIG)
+
+    groups = manifest.group_jobs(jobs)
+
+    assert sorted(group['files'] for group in groups) == [["a.pdf", "b.pdf"], ["c.pdf"], ["d.pdf", "e.pdf"], ["f.pdf"]]
+    stamped = next(group for group in groups if group['files'] == ["d.pdf", "e.pdf"])
+    assert stamped['stamp']['modele'] == "page {page}"
+    assert stamped['sources'] == ["Direction"]
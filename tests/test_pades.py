@@ -0,0 +1,46 @@
+"""Signature numérique PAdES d'un lot, vérifiée avec pyHanko"""
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("pyhanko")
+
+import pades
+
+
+@pytest.fixture(scope="module")
+def batch_key():
+    return pades.BatchKey(pades.create_test_pkcs12("Jean Dupont", passphrase="secret"), "secret")
+
+
+def test_batch_key_rejects_a_wrong_passphrase():
+    with pytest.raises(ValueError, match="mot de passe incorrect"):
+        pades.BatchKey(pades.create_test_pkcs12("Jean Dupont", passphrase="secret"), "autre")
+
+
+def test_sign_batch_signatures_validate_with_pyhanko(batch_key, make_pdf):
+    from pyhanko.pdf_utils.reader import PdfFileReader
+    from pyhanko.sign.validation import validate_pdf_signature
+    from pyhanko.sign.validation.status import SignatureCoverageLevel
+    from pyhanko_certvalidator import ValidationContext
+
+    documents = [("a.pdf", make_pdf(1)), ("b.pdf", make_pdf(3)), ("abime.pdf", b"%PDF-1.4 tronque")]
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = {name: (data, durations, error) for name, data, durations, error in
+                   pades.sign_batch(documents, batch_key, executor, reason="Approbation", location="Paris")}
+
+    assert set(results) == {"a.pdf", "b.pdf", "abime.pdf"}
+    assert results["abime.pdf"][0] is None and results["abime.pdf"][2]
+    for name in ("a.pdf", "b.pdf"):
+        signed, durations, error = results[name]
+        assert error is None
+        assert set(durations) == {'preparation', 'signature', 'latence'}
+
+        signatures = PdfFileReader(io.BytesIO(signed)).embedded_signatures
+        assert len(signatures) == 1
+        status = validate_pdf_signature(signatures[0], ValidationContext(trust_roots=[batch_key.certificate]))
+        assert status.intact and status.valid and status.trusted
+        assert status.coverage == SignatureCoverageLevel.ENTIRE_FILE
+        assert signatures[0].sig_object['/Reason'] == "Approbation"
+        assert signatures[0].sig_object['/Location'] == "Paris"
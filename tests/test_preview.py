@@ -0,0 +1,34 @@
+"""Miniatures signées rendues avec PyMuPDF comparées aux pages du PDF réellement signé"""
+import io
+from datetime import date
+
+import pytest
+
+import preview
+import signing
+
+
+@pytest.mark.parametrize("with_stamp", [False, True])
+def test_signed_thumbnail_matches_the_signed_pdf(make_pdf, signature_png, with_stamp):
+    import fitz
+    from PIL import Image, ImageChops
+
+    pdf_bytes = make_pdf(5)
+    overlay = signing.create_signature_overlay(io.BytesIO(signature_png), "Jean Dupont", date(2025, 1, 15),
+                                               100, 100, 120, 60, -20, 8).getvalue()
+    stamp = None
+    if with_stamp:
+        stamp = signing.stamp_for_file(
+            signing.stamp_params_from_profile({'nom_signataire': "Jean Dupont", 'modele_tampon': "Paraphe {page}/{total}"},
+                                              date(2025, 1, 15)),
+            "document.pdf")
+
+    rendered = preview.render_signed_page(pdf_bytes, preview.pdf_hash(pdf_bytes), 3, overlay, zoom=1.0, stamp=stamp)
+
+    signed = signing.process_pdf(pdf_bytes, io.BytesIO(overlay), "Toutes les pages", "", stamp)
+    with fitz.open(stream=signed, filetype="pdf") as document:
+        expected = document[3].get_pixmap(matrix=fitz.Matrix(1, 1)).tobytes("png")
+    difference = ImageChops.difference(Image.open(io.BytesIO(rendered)).convert("RGB"),
+                                       Image.open(io.BytesIO(expected)).convert("RGB"))
+    # Seul l'anticrénelage peut différer entre les deux rendus
+    assert max(high for _, high in difference.getextrema()) <= 8
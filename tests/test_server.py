@@ -0,0 +1,191 @@
+"""Service HTTP de signature piloté en local avec http.client"""
+import http.client
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+import server
+
+BOUNDARY = "limite-de-test"
+
+
+def multipart(fields, files):
+    """Construit un corps multipart/form-data: fields {nom: valeur}, files [(champ, nom de fichier, octets)]"""
+    body = b""
+    for name, value in fields.items():
+        value = value if isinstance(value, bytes) else value.encode("utf-8")
+        body += (f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"{name}\"\r\n\r\n").encode("utf-8")
+        body += value + b"\r\n"
+    for name, filename, data in files:
+        body += (f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"{name}\"; filename=\"{filename}\"\r\n"
+                 "Content-Type: application/octet-stream\r\n\r\n").encode("utf-8")
+        body += data + b"\r\n"
+    return body + f"--{BOUNDARY}--\r\n".encode("ascii")
+
+
+@pytest.fixture
+def signing_server(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    httpd = server.create_server(port=0, workers=1, max_requests=1, max_body_mb=8)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+    httpd.service.shutdown()
+
+
+def post(httpd, body, headers=None):
+    connection = http.client.HTTPConnection("127.0.0.1", httpd.server_address[1], timeout=30)
+    request_headers = {'Content-Type': f"multipart/form-data; boundary={BOUNDARY}"}
+    request_headers.update(headers or {})
+    connection.request("POST", "/signer", body=body, headers=request_headers)
+    response = connection.getresponse()
+    return response.status, dict(response.getheaders()), response.read()
+
+
+def test_busy_server_answers_429_to_a_large_upload(signing_server, make_pdf, signature_png):
+    body = multipart({'nom_signataire': "Jean"}, [('signature', "s.png", signature_png),
+                                                   ('fichiers', "gros.pdf", b"%PDF" + b"0" * 5 * 1024 * 1024)])
+    signing_server.service.admission.acquire()
+    try:
+        status, headers, payload = post(signing_server, body)
+    finally:
+        signing_server.service.admission.release()
+    assert status == 429
+    assert headers['Retry-After'] == "1"
+    assert "saturé" in json.loads(payload)['erreur']
+
+
+def send_with_expect(httpd, headers):
+    """Envoie seulement les en-têtes avec Expect: 100-continue et retourne la ligne de statut reçue"""
+    with socket.create_connection(("127.0.0.1", httpd.server_address[1]), timeout=10) as sock:
+        lines = ["POST /signer HTTP/1.1", "Host: localhost", "Expect: 100-continue"]
+        lines += [f"{key}: {value}" for key, value in headers.items()]
+        sock.sendall(("\r\n".join(lines) + "\r\n\r\n").encode("ascii"))
+        return sock.recv(4096).split(b"\r\n")[0].decode("ascii")
+
+
+def test_expect_100_continue_is_refused_before_the_body(signing_server):
+    content_type = f"multipart/form-data; boundary={BOUNDARY}"
+    too_large = str(9 * 1024 * 1024)
+    assert send_with_expect(signing_server, {'Content-Type': content_type, 'Content-Length': too_large}) \
+        == "HTTP/1.1 413 Request Entity Too Large"
+
+    signing_server.service.admission.acquire()
+    try:
+        assert send_with_expect(signing_server, {'Content-Type': content_type, 'Content-Length': "1000"}) \
+            == "HTTP/1.1 429 Too Many Requests"
+    finally:
+        signing_server.service.admission.release()
+
+    assert send_with_expect(signing_server, {'Content-Type': content_type, 'Content-Length': "1000"}) \
+        == "HTTP/1.1 100 Continue"
+
+
+def test_oversized_upload_without_expect_receives_413(signing_server):
+    status, _, payload = post(signing_server, multipart({}, [('fichiers', "gros.pdf", b"0" * 9 * 1024 * 1024)]))
+    assert status == 413
+    assert "volumineuse" in json.loads(payload)['erreur']
+
+
+def test_non_latin1_filename_is_sent_in_rfc5987_form(signing_server, make_pdf, signature_png):
+    body = multipart({'nom_signataire': "Jean"}, [('signature', "s.png", signature_png),
+                                                   ('fichiers', "contrat_œuvre.pdf", make_pdf(1))])
+    status, headers, payload = post(signing_server, body)
+    assert status == 200
+    assert payload.startswith(b"%PDF")
+    assert headers['Content-Disposition'] == \
+        "attachment; filename=\"signed_contrat__uvre.pdf\"; filename*=UTF-8''signed_contrat_%C5%93uvre.pdf"
+
+
+def test_content_disposition_fallback_cannot_break_the_header():
+    assert server.content_disposition('a"b\r\nX-Test: 1.pdf') == \
+        "attachment; filename=\"a_b__X-Test: 1.pdf\"; filename*=UTF-8''a%22b%0D%0AX-Test%3A%201.pdf"
+
+
+def page_texts(pdf_bytes):
+    import fitz
+
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as document:
+        return [page.get_text() for page in document]
+
+
+def get(httpd, path):
+    connection = http.client.HTTPConnection("127.0.0.1", httpd.server_address[1], timeout=30)
+    connection.request("GET", path)
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def test_single_pdf_is_returned_signed(signing_server, make_pdf, signature_png):
+    body = multipart({'nom_signataire': "Jean Dupont", 'page_option': "Dernière page uniquement"},
+                     [('signature', "s.png", signature_png), ('fichiers', "contrat.pdf", make_pdf(3))])
+    status, headers, payload = post(signing_server, body)
+
+    assert status == 200
+    assert headers['Content-Type'] == "application/pdf"
+    assert int(headers['Content-Length']) == len(payload)
+    texts = page_texts(payload)
+    assert ["Jean Dupont" in text for text in texts] == [False, False, True]
+
+
+def test_several_pdfs_are_returned_in_a_zip_with_the_errors(signing_server, make_pdf, signature_png):
+    import io
+    import zipfile
+
+    body = multipart({'nom_signataire': "Jean Dupont"},
+                     [('signature', "s.png", signature_png), ('fichiers', "a.pdf", make_pdf(1)),
+                      ('fichiers', "b.pdf", make_pdf(2)), ('fichiers', "abime.pdf", b"%PDF-1.4 tronque")])
+    status, headers, payload = post(signing_server, body)
+
+    assert status == 200
+    assert headers['Content-Type'] == "application/zip"
+    assert headers['Transfer-Encoding'] == "chunked"
+    with zipfile.ZipFile(io.BytesIO(payload)) as archive:
+        assert sorted(archive.namelist()) == ["erreurs.txt", "signed_a.pdf", "signed_b.pdf"]
+        assert "Jean Dupont" in page_texts(archive.read("signed_b.pdf"))[0]
+        assert archive.read("erreurs.txt").decode("utf-8").startswith("abime.pdf: ")
+
+
+@pytest.mark.parametrize("fields, files, headers, expected_status, message", [
+    ({'nom_signataire': "Jean"}, [('fichiers', "a.pdf", b"%PDF")], None, 400, "Aucune image de signature"),
+    ({'nom_signataire': "Jean"}, [], None, 400, "Aucun fichier PDF"),
+    ({'profil': "Inconnu"}, [('fichiers', "a.pdf", b"%PDF")], None, 404, "introuvable"),
+    ({'nom_signataire': "Jean", 'x_position': "droite"}, [('signature', "s.png", b"png"), ('fichiers', "a.pdf", b"%PDF")],
+     None, 400, "Valeur invalide pour 'x_position'"),
+    ({'nom_signataire': "Jean"}, [('fichiers', "a.pdf", b"%PDF")], {'Content-Type': "application/json"}, 415,
+     "multipart/form-data"),
+])
+def test_invalid_requests_receive_a_json_error(signing_server, fields, files, headers, expected_status, message):
+    status, response_headers, payload = post(signing_server, multipart(fields, files), headers)
+    assert status == expected_status
+    assert response_headers['Content-Type'].startswith("application/json")
+    assert message in json.loads(payload)['erreur']
+
+
+def test_metrics_count_responses_and_signed_files(signing_server, make_pdf, signature_png):
+    post(signing_server, multipart({'nom_signataire': "Jean"}, [('signature', "s.png", signature_png),
+                                                                ('fichiers', "a.pdf", make_pdf(1))]))
+    post(signing_server, multipart({'nom_signataire': "Jean"}, []))
+    assert get(signing_server, "/inconnu")[0] == 404
+
+    # Une réponse est comptée juste après son envoi: le client peut la recevoir avant. Les lectures de
+    # /metrics sont elles-mêmes comptées (réponses 200) à partir de la deuxième
+    deadline = time.monotonic() + 5
+    status, metrics = get(signing_server, "/metrics")
+    while metrics['requests_total'] < 3 and time.monotonic() < deadline:
+        time.sleep(0.05)
+        status, metrics = get(signing_server, "/metrics")
+    polls = metrics['requests_total'] - 3
+
+    assert status == 200
+    assert metrics['responses'] == {'200': 1 + polls, '400': 1, '404': 1}
+    assert metrics['files_signed'] == 1
+    assert metrics['files_failed'] == 0
+    assert metrics['active_requests'] == 0
+    assert metrics['queue_depth'] == 0
+    assert metrics['latency_ms']['count'] == metrics['requests_total']
@@ -0,0 +1,75 @@
+"""Destinations des PDFs signés: dossier local et stockage compatible S3"""
+import os
+
+import pytest
+
+import sinks
+
+
+def test_output_sink_requires_write():
+    class IncompleteSink(sinks.OutputSink):
+        pass
+
+    with pytest.raises(TypeError):
+        IncompleteSink()
+
+
+def test_local_directory_sink_writes_same_name_uploads_without_leftovers(tmp_path):
+    sink = sinks.LocalDirectorySink(str(tmp_path / "sortie"), max_concurrency=8)
+    payloads = [bytes([i]) * (256 * 1024) for i in range(16)]
+    for data in payloads:
+        # Même nom de base depuis des dossiers différents: les envois se chevauchent
+        sink.submit("lot/signed_contrat.pdf", data)
+    results = sink.close()
+
+    assert [error for _, _, _, error in results] == [None] * len(payloads)
+    assert os.listdir(tmp_path / "sortie") == ["signed_contrat.pdf"]
+    final = (tmp_path / "sortie" / "signed_contrat.pdf").read_bytes()
+    assert final in payloads
+    assert oct(os.stat(tmp_path / "sortie" / "signed_contrat.pdf").st_mode & 0o777) == oct(0o644)
+
+
+@pytest.fixture
+def s3_endpoint(monkeypatch):
+    """Point d'accès S3 local (moto), sans identifiants réels"""
+    moto_server = pytest.importorskip("moto.server")
+    pytest.importorskip("boto3")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    server = moto_server.ThreadedMotoServer(ip_address="127.0.0.1", port=0)
+    server.start()
+    host, port = server.get_host_and_port()
+    yield f"http://{host}:{port}"
+    server.stop()
+
+
+def test_s3_sink_uploads_large_files_in_parts(s3_endpoint):
+    import boto3
+
+    client = boto3.client("s3", endpoint_url=s3_endpoint)
+    client.create_bucket(Bucket="signes")
+    sink = sinks.S3Sink("signes", prefix="/lot/", endpoint_url=s3_endpoint, max_concurrency=2, part_size_mb=5)
+    small = b"%PDF petit"
+    large = os.urandom(11 * 1024 * 1024)
+    sink.submit("signed_petit.pdf", small)
+    sink.submit("dossier/signed_gros.pdf", large)
+    results = sink.close()
+
+    assert sink.label == "s3://signes/lot"
+    assert [(name, location, error) for name, location, _, error in results] == [
+        ("signed_petit.pdf", "s3://signes/lot/signed_petit.pdf", None),
+        ("dossier/signed_gros.pdf", "s3://signes/lot/signed_gros.pdf", None),
+    ]
+    assert client.get_object(Bucket="signes", Key="lot/signed_petit.pdf")['Body'].read() == small
+    uploaded = client.head_object(Bucket="signes", Key="lot/signed_gros.pdf")
+    assert uploaded['ContentType'] == "application/pdf"
+    assert uploaded['ContentLength'] == len(large)
+    # ETag multipart: empreinte des parties suivie du nombre de parties (5 + 5 + 1 Mo)
+    assert uploaded['ETag'].strip('"').endswith("-3")
+    assert client.get_object(Bucket="signes", Key="lot/signed_gros.pdf")['Body'].read() == large
+
+
+def test_s3_sink_rejects_a_missing_bucket(s3_endpoint):
+    with pytest.raises(ValueError, match="Bucket 'absent' inaccessible"):
+        sinks.S3Sink("absent", endpoint_url=s3_endpoint)
@@ -0,0 +1,26 @@
+"""Modèles de tampon par page: champs autorisés et paramètres lus dans un profil"""
+from datetime import date
+
+import pytest
+
+import signing
+
+
+def test_stamp_template_fields_accepts_known_fields():
+    assert signing.stamp_template_fields("Paraphe {nom_signataire} - page {page}/{total}") == [
+        "nom_signataire", "page", "total"]
+    assert signing.stamp_template_fields("Sans champ") == []
+
+
+@pytest.mark.parametrize("template, message", [
+    ("page {numero}", "Champ inconnu"),
+    ("page {page", "mal formé"),
+    ("page }", "mal formé"),
+])
+def test_stamp_template_fields_rejects_invalid_templates(template, message):
+    with pytest.raises(ValueError, match=message):
+        signing.stamp_template_fields(template)
+
+
+def test_stamp_params_from_profile_without_template():
+    assert signing.stamp_params_from_profile({'nom_signataire': "Jean"}, date(2025, 1, 15)) is None
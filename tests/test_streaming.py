@@ -0,0 +1,64 @@
+"""Équivalence des modes de signature en mémoire et en streaming"""
+import io
+from datetime import date
+
+import pytest
+
+import signing
+
+
+def make_overlay(signature_png):
+    return signing.create_signature_overlay(io.BytesIO(signature_png), "Jean Dupont", date(2025, 1, 15),
+                                            100, 100, 120, 60, -20, 8)
+
+
+def page_texts(pdf_bytes):
+    import fitz
+
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as document:
+        return [page.get_text() for page in document]
+
+
+@pytest.mark.parametrize("page_option, custom_pages", [
+    ("Première page uniquement", ""),
+    ("Dernière page uniquement", ""),
+    ("Toutes les pages", ""),
+    ("Pages personnalisées", "2,4-5"),
+])
+@pytest.mark.parametrize("with_stamp", [False, True])
+def test_process_pdf_and_process_pdf_file_sign_the_same_pages(tmp_path, make_pdf, signature_png, page_option,
+                                                              custom_pages, with_stamp):
+    pdf_bytes = make_pdf(6)
+    overlay = make_overlay(signature_png)
+    stamp = None
+    if with_stamp:
+        stamp = signing.stamp_for_file(
+            signing.stamp_params_from_profile({'nom_signataire': "Jean Dupont", 'modele_tampon': "Paraphe {page}/{total}"},
+                                              date(2025, 1, 15)),
+            "document.pdf")
+
+    in_memory = signing.process_pdf(pdf_bytes, overlay, page_option, custom_pages, stamp)
+
+    input_path = tmp_path / "document.pdf"
+    output_path = tmp_path / "signe.pdf"
+    input_path.write_bytes(pdf_bytes)
+    overlay.seek(0)
+    # Blocs de 2 pages pour passer par plusieurs mises à jour incrémentales
+    signing.process_pdf_file(str(input_path), str(output_path), overlay, page_option, custom_pages, chunk_pages=2,
+                             stamp=stamp)
+    streamed = output_path.read_bytes()
+
+    expected_pages = signing.get_pages_to_sign(page_option, custom_pages, 6)
+    for texts in (page_texts(in_memory), page_texts(streamed)):
+        assert len(texts) == 6
+        for page_num, text in enumerate(texts, start=1):
+            assert f"Contenu page {page_num}" in text
+            assert ("Jean Dupont" in text) == (page_num in expected_pages)
+            if with_stamp:
+                assert (f"Paraphe {page_num}/6" in text) == (page_num in expected_pages)
+
+
+def test_sign_pdf_bytes_streams_above_threshold(make_pdf, signature_png):
+    signed = signing.sign_pdf_bytes(make_pdf(3), make_overlay(signature_png), "Toutes les pages",
+                                    streaming_threshold_mb=0)
+    assert all("Jean Dupont" in text for text in page_texts(signed))
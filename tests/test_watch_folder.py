@@ -0,0 +1,139 @@
+"""Détection des fichiers stables et rangement après signature par le démon de dossier"""
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import pytest
+
+import signing
+import watch_folder
+
+
+@pytest.fixture
+def watcher_dirs(tmp_path, monkeypatch, signature_png):
+    """Profil 'Démon' avec image dans un HOME temporaire, et dossiers d'entrée et de sortie"""
+    monkeypatch.setenv("HOME", str(tmp_path))
+    image_path = tmp_path / "signature.png"
+    image_path.write_bytes(signature_png)
+    profile = {'nom_signataire': "Jean Dupont", 'page_option': "Toutes les pages",
+               'signature_image_path': str(image_path)}
+    with open(signing.get_profiles_file_path(), 'w', encoding='utf-8') as f:
+        json.dump({'Démon': profile}, f)
+    return tmp_path / "entree", tmp_path / "sortie"
+
+
+def make_watcher(input_dir, output_dir, **kwargs):
+    return watch_folder.FolderWatcher("Démon", str(input_dir), str(output_dir), settle=0, **kwargs)
+
+
+def test_output_inside_input_is_rejected(watcher_dirs):
+    input_dir, _ = watcher_dirs
+    with pytest.raises(ValueError, match="distinct du dossier d'entrée"):
+        make_watcher(input_dir, input_dir / "signes")
+
+
+def test_scan_returns_pdfs_once_they_stop_changing(watcher_dirs, make_pdf):
+    input_dir, output_dir = watcher_dirs
+    watcher = make_watcher(input_dir, output_dir)
+    (input_dir / "a.pdf").write_bytes(make_pdf(1))
+    (input_dir / "B.PDF").write_bytes(make_pdf(1))
+    (input_dir / "vide.pdf").write_bytes(b"")
+    (input_dir / ".cache.pdf").write_bytes(make_pdf(1))
+    (input_dir / "notes.txt").write_text("pas un PDF")
+
+    # Premier passage: fichiers découverts, pas encore stables
+    assert watcher.scan() == []
+    assert watcher.scan() == sorted([str(input_dir / "B.PDF"), str(input_dir / "a.pdf")])
+
+    # Un fichier modifié redevient instable; un fichier disparu est oublié
+    with open(input_dir / "a.pdf", 'ab') as f:
+        f.write(b"\n% ajout")
+    os.remove(input_dir / "B.PDF")
+    assert watcher.scan() == []
+    assert set(watcher._seen) == {str(input_dir / "a.pdf"), str(input_dir / "vide.pdf")}
+
+
+def test_collect_moves_signed_and_failed_files(watcher_dirs, make_pdf):
+    import fitz
+
+    input_dir, output_dir = watcher_dirs
+    watcher = make_watcher(input_dir, output_dir)
+    (input_dir / "a.pdf").write_bytes(make_pdf(2))
+    (input_dir / "abime.pdf").write_bytes(b"%PDF-1.4 tronque")
+    watcher.scan()
+    watcher._ready = watcher.scan()
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        watcher.dispatch(executor)
+        done, _ = wait(list(watcher._running))
+        watcher.collect(done)
+
+    assert watcher._running == {}
+    assert os.listdir(input_dir / watch_folder.DONE_DIR) == ["a.pdf"]
+    assert os.listdir(input_dir / watch_folder.ERROR_DIR) == ["abime.pdf"]
+    assert os.listdir(output_dir) == ["signed_a.pdf"]
+    assert (watcher.stats.processed, watcher.stats.failed) == (1, 1)
+    with fitz.open(output_dir / "signed_a.pdf") as document:
+        assert all("Jean Dupont" in page.get_text() for page in document)
+    assert watcher.scan() == []
+
+
+def test_unmovable_file_is_skipped_until_modified(watcher_dirs, make_pdf, monkeypatch):
+    input_dir, output_dir = watcher_dirs
+    watcher = make_watcher(input_dir, output_dir)
+    (input_dir / "a.pdf").write_bytes(make_pdf(1))
+    watcher.scan()
+    watcher._ready = watcher.scan()
+
+    def refuse_move(src, dst):
+        raise PermissionError("lecture seule")
+
+    monkeypatch.setattr(shutil, "move", refuse_move)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        watcher.dispatch(executor)
+        done, _ = wait(list(watcher._running))
+        watcher.collect(done)
+
+    assert (input_dir / "a.pdf").exists()
+    assert watcher.scan() == []
+    assert watcher.scan() == []
+
+    with open(input_dir / "a.pdf", 'ab') as f:
+        f.write(b"\n% nouvelle version")
+    watcher.scan()
+    assert watcher.scan() == [str(input_dir / "a.pdf")]
+
+
+class RecordingExecutor:
+    """Exécuteur qui garde les fichiers soumis sans les traiter"""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, func, src_path, *args):
+        from concurrent.futures import Future
+
+        self.submitted.append(os.path.basename(src_path))
+        return Future()
+
+
+def test_dispatch_never_exceeds_twice_the_workers_in_flight(watcher_dirs):
+    input_dir, output_dir = watcher_dirs
+    watcher = make_watcher(input_dir, output_dir, workers=2, batch_size=50)
+    watcher._ready = [str(input_dir / f"{i}.pdf") for i in range(7)]
+    watcher._ready_since = 0.0
+    executor = RecordingExecutor()
+
+    watcher.dispatch(executor)
+    assert executor.submitted == ["0.pdf", "1.pdf", "2.pdf", "3.pdf"]
+    watcher.dispatch(executor)
+    assert len(executor.submitted) == 4
+
+    # Une place libérée: un seul fichier de plus, le reste du lot reste prêt
+    future = next(iter(watcher._running))
+    watcher._running.pop(future)
+    watcher.dispatch(executor)
+    assert executor.submitted[4:] == ["4.pdf"]
+    assert watcher._ready == [str(input_dir / "5.pdf"), str(input_dir / "6.pdf")]
+    assert watcher._ready_since == 0.0
@@ -0,0 +1,301 @@
+"""Mode démon: surveille un dossier d'entrée et signe les nouveaux PDFs avec un profil sauvegardé
+
+Utilisation:
+    python watch_folder.py --profil "Signature officielle" --entree /partage/a_signer --sortie /partage/signes
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import shutil
+import signal
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+
+import signing
+
+logger = logging.getLogger("watch_folder")
+
+DONE_DIR = ".traites"
+ERROR_DIR = ".erreurs"
+
+def sign_file(src_path, dst_path, overlay_bytes, page_option, custom_pages,
+              streaming_threshold_mb=signing.STREAMING_THRESHOLD_MB, stamp=None):
+    """Signe un fichier du dossier d'entrée et l'écrit dans le dossier de sortie (exécuté dans un worker)"""
+    # Écriture atomique pour ne jamais exposer un fichier partiel en sortie
+    tmp_path = dst_path + ".part"
+    try:
+        size = signing.sign_pdf_file(src_path, tmp_path, io.BytesIO(overlay_bytes), page_option, custom_pages,
+                                     streaming_threshold_mb, signing.stamp_for_file(stamp, os.path.basename(src_path)))
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, dst_path)
+    return size
+
+class Stats:
+    """Compteurs de débit et d'arriéré du démon"""
+
+    def __init__(self, window=60):
+        self.window = window
+        self.processed = 0
+        self.failed = 0
+        self.backlog = 0
+        self.in_progress = 0
+        self.started = time.monotonic()
+        self._recent = deque()
+
+    def record(self, ok):
+        """Enregistre la fin du traitement d'un fichier"""
+        if ok:
+            self.processed += 1
+            self._recent.append(time.monotonic())
+        else:
+            self.failed += 1
+
+    def throughput(self):
+        """Retourne le débit en fichiers par minute sur la fenêtre glissante"""
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] > self.window:
+            self._recent.popleft()
+        elapsed = min(self.window, now - self.started) or 1
+        return len(self._recent) * 60 / elapsed
+
+    def snapshot(self):
+        """Retourne l'état courant des compteurs"""
+        return {
+            'processed': self.processed,
+            'failed': self.failed,
+            'backlog': self.backlog,
+            'in_progress': self.in_progress,
+            'files_per_minute': round(self.throughput(), 1),
+            'uptime_s': round(time.monotonic() - self.started),
+            'updated': datetime.now().isoformat(timespec='seconds'),
+        }
+
+class FolderWatcher:
+    """Détecte les PDFs stables du dossier d'entrée et les signe par lots"""
+
+    def __init__(self, profile_name, input_dir, output_dir, workers=2, settle=2.0,
+                 batch_window=1.0, batch_size=50, poll_interval=0.5, status_file=None,
+                 streaming_threshold_mb=signing.STREAMING_THRESHOLD_MB):
+        profiles = signing.read_profiles()
+        if profile_name not in profiles:
+            raise ValueError(f"Profil '{profile_name}' introuvable")
+        self.profile_name = profile_name
+        self.profile = profiles[profile_name]
+        self.signature_bytes = signing.read_signature_bytes(self.profile.get('signature_image_path'))
+        if not self.signature_bytes:
+            raise ValueError(f"Le profil '{profile_name}' n'a pas d'image de signature")
+        signing.stamp_template_fields(self.profile.get('modele_tampon') or "")
+        # Une sortie dans le dossier surveillé ferait re-signer sans fin les fichiers produits
+        input_real, output_real = os.path.realpath(input_dir), os.path.realpath(output_dir)
+        if os.path.commonpath([input_real, output_real]) == input_real:
+            raise ValueError("Le dossier de sortie doit être distinct du dossier d'entrée et en dehors de celui-ci")
+
+        self.input_dir = input_dir
+        self.output_dir = output_dir
+        self.workers = workers
+        self.settle = settle
+        self.batch_window = batch_window
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.status_file = status_file
+        self.streaming_threshold_mb = streaming_threshold_mb
+        self.stats = Stats()
+
+        # chemin -> (taille, mtime, instant depuis lequel le fichier est inchangé)
+        self._seen = {}
+        self._ready = []
+        self._ready_since = None
+        # future -> chemin des fichiers en cours de traitement
+        self._running = {}
+        # chemin -> (taille, mtime) des fichiers traités qui n'ont pas pu être déplacés: ignorés tant
+        # qu'ils ne sont pas modifiés, sinon ils seraient signés à nouveau à chaque passage
+        self._unmovable = {}
+        self._stopping = False
+
+        for sub in (DONE_DIR, ERROR_DIR):
+            os.makedirs(os.path.join(input_dir, sub), exist_ok=True)
+        os.makedirs(output_dir, exist_ok=True)
+
+    def stop(self, *_):
+        """Demande l'arrêt après les traitements en cours"""
+        self._stopping = True
+
+    def scan(self):
+        """Met à jour l'état des fichiers et retourne ceux qui n'ont plus bougé depuis `settle` secondes"""
+        now = time.monotonic()
+        present = set()
+        stable = []
+        busy = set(self._ready) | set(self._running.values())
+        with os.scandir(self.input_dir) as entries:
+            for entry in entries:
+                name = entry.name
+                if not entry.is_file() or name.startswith(".") or not name.lower().endswith(".pdf"):
+                    continue
+                path = entry.path
+                if path in busy:
+                    continue
+                present.add(path)
+                st = entry.stat()
+                signature = (st.st_size, st.st_mtime)
+                if path in self._unmovable:
+                    if self._unmovable[path] == signature:
+                        continue
+                    del self._unmovable[path]
+                previous = self._seen.get(path)
+                if previous is None or previous[:2] != signature:
+                    # Fichier nouveau ou encore en cours d'écriture
+                    self._seen[path] = signature + (now,)
+                elif st.st_size > 0 and now - previous[2] >= self.settle:
+                    stable.append(path)
+
+        # Oublier les fichiers disparus
+        for path in list(self._seen):
+            if path not in present and path not in busy:
+                del self._seen[path]
+        for path in list(self._unmovable):
+            if path not in present:
+                del self._unmovable[path]
+        return sorted(stable)
+
+    def build_overlay(self):
+        """Crée l'overlay du profil une seule fois pour tout le lot"""
+        params = signing.overlay_params_from_profile(self.profile, datetime.now().date())
+        packet = signing.create_signature_overlay(io.BytesIO(self.signature_bytes), **params)
+        return packet.getvalue()
+
+    def dispatch(self, executor):
+        """Soumet au pool le lot prêt, sans dépasser `workers * 2` fichiers en vol"""
+        count = min(self.batch_size, self.workers * 2 - len(self._running))
+        if count <= 0:
+            return
+        batch = self._ready[:count]
+        self._ready = self._ready[count:]
+        # Les fichiers restants ont déjà attendu la fenêtre de regroupement: ils partent dès qu'une place se libère
+        if not self._ready:
+            self._ready_since = None
+
+        overlay_bytes = self.build_overlay()
+        stamp = signing.stamp_params_from_profile(self.profile, datetime.now().date())
+        page_option = self.profile.get('page_option', "Première page uniquement")
+        custom_pages = self.profile.get('custom_pages', "")
+        for path in batch:
+            dst_path = os.path.join(self.output_dir, f"signed_{os.path.basename(path)}")
+            future = executor.submit(sign_file, path, dst_path, overlay_bytes, page_option, custom_pages,
+                                     self.streaming_threshold_mb, stamp)
+            self._running[future] = path
+        logger.info("Lot de %d fichier(s) soumis", len(batch))
+
+    def collect(self, done):
+        """Range les fichiers terminés et met à jour les compteurs"""
+        for future in done:
+            path = self._running.pop(future)
+            self._seen.pop(path, None)
+            name = os.path.basename(path)
+            try:
+                future.result()
+                target = DONE_DIR
+                self.stats.record(True)
+            except Exception as e:
+                target = ERROR_DIR
+                self.stats.record(False)
+                logger.error("Erreur lors du traitement de %s: %s", name, e)
+            try:
+                shutil.move(path, os.path.join(self.input_dir, target, name))
+            except OSError as e:
+                logger.error("Impossible de déplacer %s, ignoré tant qu'il n'est pas modifié: %s", name, e)
+                try:
+                    st = os.stat(path)
+                    self._unmovable[path] = (st.st_size, st.st_mtime)
+                except OSError:
+                    pass
+
+    def write_status(self):
+        """Publie les compteurs dans le journal et dans le fichier d'état éventuel"""
+        snapshot = self.stats.snapshot()
+        logger.info("Traités: %(processed)d | Erreurs: %(failed)d | En cours: %(in_progress)d | "
+                    "Arriéré: %(backlog)d | Débit: %(files_per_minute).1f fichiers/min", snapshot)
+        if self.status_file:
+            tmp_path = self.status_file + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, indent=2)
+            os.replace(tmp_path, self.status_file)
+
+    def run(self, stats_interval=10.0):
+        """Boucle principale du démon"""
+        logger.info("Surveillance de %s avec le profil '%s' (%d workers)",
+                    self.input_dir, self.profile_name, self.workers)
+        last_status = 0.0
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            while not (self._stopping and not self._running):
+                if not self._stopping:
+                    for path in self.scan():
+                        self._ready.append(path)
+                        if self._ready_since is None:
+                            self._ready_since = time.monotonic()
+
+                    # Regrouper les arrivées pour amortir la création de l'overlay; dispatch ne soumet
+                    # que les places libres parmi les `workers * 2` fichiers en vol, le reste attend
+                    batch_due = self._ready and (
+                        len(self._ready) >= self.batch_size
+                        or time.monotonic() - self._ready_since >= self.batch_window
+                    )
+                    if batch_due and len(self._running) < self.workers * 2:
+                        self.dispatch(executor)
+
+                if self._running:
+                    done, _ = wait(list(self._running), timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                    self.collect(done)
+                else:
+                    time.sleep(self.poll_interval)
+
+                self.stats.in_progress = len(self._running)
+                self.stats.backlog = len(self._seen) - len(self._running)
+                if time.monotonic() - last_status >= stats_interval:
+                    self.write_status()
+                    last_status = time.monotonic()
+        self.write_status()
+        logger.info("Arrêt du démon")
+
+def main():
+    parser = argparse.ArgumentParser(description="Signature automatique des PDFs déposés dans un dossier")
+    parser.add_argument("--profil", required=True, help="Nom du profil de signature sauvegardé")
+    parser.add_argument("--entree", required=True, help="Dossier surveillé")
+    parser.add_argument("--sortie", required=True, help="Dossier des PDFs signés")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Nombre de traitements simultanés")
+    parser.add_argument("--stabilite", type=float, default=2.0,
+                        help="Secondes sans modification avant de considérer un fichier comme complet")
+    parser.add_argument("--fenetre-lot", type=float, default=1.0,
+                        help="Secondes d'attente pour regrouper les arrivées en un lot")
+    parser.add_argument("--taille-lot", type=int, default=50, help="Nombre maximal de fichiers par lot")
+    parser.add_argument("--fichier-etat", help="Fichier JSON où publier les compteurs")
+    parser.add_argument("--intervalle-stats", type=float, default=10.0, help="Secondes entre deux rapports")
+    parser.add_argument("--seuil-streaming", type=float, default=signing.STREAMING_THRESHOLD_MB,
+                        help="Taille (Mo) au-delà de laquelle un PDF est signé par blocs de pages, à mémoire constante")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    watcher = FolderWatcher(
+        args.profil,
+        args.entree,
+        args.sortie,
+        workers=args.workers,
+        settle=args.stabilite,
+        batch_window=args.fenetre_lot,
+        batch_size=args.taille_lot,
+        status_file=args.fichier_etat,
+        streaming_threshold_mb=args.seuil_streaming,
+    )
+    signal.signal(signal.SIGINT, watcher.stop)
+    signal.signal(signal.SIGTERM, watcher.stop)
+    watcher.run(stats_interval=args.intervalle_stats)
+
+if __name__ == "__main__":
+    main()